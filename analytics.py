@@ -0,0 +1,155 @@
+"""
+Correction Analytics - error statistics over many texts as columnar tables
+Builds pandas tables straight from CorrectionBatch columns and aggregates them with group-bys
+
+Report on the FCE learner sentences with:
+    python analytics.py --out analytics
+"""
+
+import argparse
+import os
+from array import array
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+import pandas as pd
+from corrections import ERROR_TYPES, SEVERITIES, CorrectionBatch
+from grammar_analyzer import get_age_band
+from grammar_patterns import ALL_GRAMMAR_PATTERNS
+
+AGE_BANDS = ('beginner', 'intermediate', 'advanced')
+
+
+def _column(values: array) -> np.ndarray:
+    """Zero-copy numpy view of a typed array column"""
+    return np.frombuffer(values, dtype=np.dtype(values.typecode), count=len(values))
+
+
+def batch_from_results(results: Sequence[Dict]) -> Tuple[CorrectionBatch, List[int], List[int]]:
+    """Batch, ages and word counts from ``GrammarAnalyzer.analyze`` results"""
+    batch = CorrectionBatch()
+    for result in results:
+        batch.add_text(result['corrections'])
+    return (batch, [result['age'] for result in results],
+            [len(result['original'].split()) for result in results])
+
+
+def build_tables(batch: CorrectionBatch, ages: Optional[Sequence[int]] = None,
+                 word_counts: Optional[Sequence[int]] = None) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """(corrections, texts) tables for a batch.
+
+    ``corrections`` has one row per correction with categorical type,
+    severity and age band columns; ``texts`` has one row per text, so texts
+    without any correction still count in the rates.
+    """
+    offsets = _column(batch.text_offsets).astype(np.int64)
+    per_text = np.diff(offsets)
+    texts = pd.DataFrame({'text': np.arange(batch.text_count), 'corrections': per_text})
+    if ages is not None:
+        ages = np.asarray(ages, dtype=np.int64)
+        # Few distinct ages, so map those once instead of every text
+        bands = {age: get_age_band(int(age)) for age in np.unique(ages)}
+        texts['age'] = ages
+        texts['age_band'] = pd.Categorical(texts['age'].map(bands), categories=AGE_BANDS)
+    if word_counts is not None:
+        texts['words'] = np.asarray(word_counts, dtype=np.int64)
+
+    row_text = np.repeat(np.arange(batch.text_count), per_text)
+    corrections = pd.DataFrame({
+        'text': row_text,
+        'type': pd.Categorical.from_codes(_column(batch.type_codes), categories=list(ERROR_TYPES)),
+        'severity': pd.Categorical.from_codes(_column(batch.severity_codes), categories=list(SEVERITIES)),
+        'rule_id': _column(batch.rule_ids),
+        'start': _column(batch.starts),
+        'end': _column(batch.ends),
+    })
+    if ages is not None:
+        corrections['age_band'] = texts['age_band'].to_numpy()[row_text]
+    return corrections, texts
+
+
+def error_type_counts(corrections: pd.DataFrame) -> pd.DataFrame:
+    """Corrections per error type, most frequent first"""
+    counts = corrections.groupby('type', observed=True).size().rename('count')
+    table = counts.to_frame()
+    table['share'] = table['count'] / max(len(corrections), 1)
+    return table.sort_values('count', ascending=False).reset_index()
+
+
+def severity_distribution(corrections: pd.DataFrame) -> pd.DataFrame:
+    """Share of each severity within every error type"""
+    counts = corrections.groupby(['type', 'severity'], observed=True).size().unstack(fill_value=0)
+    counts = counts.reindex(columns=list(SEVERITIES), fill_value=0)
+    return counts.div(counts.sum(axis=1), axis=0).reset_index()
+
+
+def age_band_rates(corrections: pd.DataFrame, texts: pd.DataFrame) -> pd.DataFrame:
+    """Errors of each type per text (and per 100 words, when known) in each age band"""
+    errors = corrections.groupby(['age_band', 'type'], observed=True).size().rename('errors')
+    per_band = texts.groupby('age_band', observed=True).agg(
+        texts=('text', 'size'), **({'words': ('words', 'sum')} if 'words' in texts else {}))
+    table = errors.reset_index().merge(per_band.reset_index(), on='age_band')
+    table['per_text'] = table['errors'] / table['texts']
+    if 'words' in table:
+        table['per_100_words'] = 100 * table['errors'] / table['words'].clip(lower=1)
+    return table.sort_values(['age_band', 'errors'], ascending=[True, False], ignore_index=True)
+
+
+def rule_hit_rates(corrections: pd.DataFrame, texts: pd.DataFrame,
+                   patterns: Sequence[str] = tuple(ALL_GRAMMAR_PATTERNS)) -> pd.DataFrame:
+    """How often each grammar rule fires, and in what share of the texts.
+
+    ``patterns`` must be the pattern table the analyzer was built with,
+    since rule ids are positions in it.
+    """
+    rules = corrections[corrections['rule_id'] >= 0]
+    table = rules.groupby('rule_id').agg(hits=('text', 'size'), texts_hit=('text', 'nunique'))
+    table['hit_rate'] = table['texts_hit'] / max(len(texts), 1)
+    table['pattern'] = np.asarray(patterns, dtype=object)[table.index.to_numpy()]
+    return table.sort_values('hits', ascending=False).reset_index()
+
+
+def summarize(corrections: pd.DataFrame, texts: pd.DataFrame) -> Dict[str, pd.DataFrame]:
+    """Every aggregate that applies to the tables"""
+    report = {
+        'error_types': error_type_counts(corrections),
+        'severity': severity_distribution(corrections),
+        'rules': rule_hit_rates(corrections, texts),
+    }
+    if 'age_band' in texts:
+        report['age_bands'] = age_band_rates(corrections, texts)
+    return report
+
+
+def write_parquet(report: Dict[str, pd.DataFrame], directory: str) -> List[str]:
+    """Save each aggregate as ``<directory>/<name>.parquet`` (needs pyarrow)"""
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for name, table in report.items():
+        path = os.path.join(directory, f"{name}.parquet")
+        table.to_parquet(path, index=False)
+        paths.append(path)
+    return paths
+
+
+if __name__ == "__main__":
+    import spacy
+    from corpus import iter_fce_sentences
+    from grammar_analyzer import GrammarAnalyzer
+    from spelling_index import load_spelling_index
+
+    parser = argparse.ArgumentParser(description="Error statistics for the FCE learner sentences")
+    parser.add_argument("--out", default="analytics", help="Directory for the parquet files")
+    parser.add_argument("--age", type=int, default=16, help="Learner age used to pick the rules")
+    parser.add_argument("--limit", type=int, default=None, help="Only the first N sentences")
+    args = parser.parse_args()
+
+    texts = [' '.join(token for token, _ in sentence) for sentence in iter_fce_sentences()]
+    texts = texts[:args.limit]
+    analyzer = GrammarAnalyzer(spacy.load("en_core_web_lg"), spelling=load_spelling_index())
+    batch = analyzer.detect_many(texts, args.age)
+    corrections, text_table = build_tables(batch, [args.age] * len(texts),
+                                           [len(text.split()) for text in texts])
+    report = summarize(corrections, text_table)
+    print(report['error_types'].to_string(index=False))
+    for path in write_parquet(report, args.out):
+        print(f"Wrote {path}")
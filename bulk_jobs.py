@@ -0,0 +1,172 @@
+"""
+Bulk Grading Jobs - grade a whole class set in the background
+Uploads are parsed into rows and analyzed by a small worker pool
+"""
+
+import csv
+import io
+import json
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+from grammar_analyzer import GrammarAnalyzer
+from history_store import HistoryStore
+
+# Few workers on purpose: interactive requests must keep getting the CPU
+BULK_WORKERS = 2
+# Share of the time each worker spends analyzing; it rests the remainder.
+# Analysis holds the GIL, so 2 workers x 0.25 leave about half of it to
+# interactive requests on the script thread
+BULK_DUTY_CYCLE = 0.25
+# Finished jobs are forgotten after this many seconds
+JOB_TTL = 24 * 3600
+
+def parse_upload(filename: str, data: bytes, default_age: int = 12) -> List[Dict]:
+    """Rows from a CSV or JSONL upload: each needs 'text', optionally 'student_id' and 'age'"""
+    content = data.decode('utf-8-sig')
+    if filename.lower().endswith('.jsonl'):
+        records = [json.loads(line) for line in content.splitlines() if line.strip()]
+    elif filename.lower().endswith('.csv'):
+        records = list(csv.DictReader(io.StringIO(content)))
+    else:
+        raise ValueError("Please upload a .csv or .jsonl file")
+
+    rows = []
+    for number, record in enumerate(records, 1):
+        if not isinstance(record, dict):
+            raise ValueError(f"Row {number} is not an object with a 'text' field")
+        text = str(record.get('text') or '').strip()
+        if not text:
+            raise ValueError(f"Row {number} has no 'text'")
+        age = record.get('age')
+        try:
+            age = int(age) if str(age or '').strip() else default_age
+        except (TypeError, ValueError):
+            raise ValueError(f"Row {number} has an invalid age: {age!r}")
+        rows.append({
+            'student_id': str(record.get('student_id') or record.get('student') or '').strip(),
+            'age': age,
+            'text': text
+        })
+    return rows
+
+
+class Job:
+    """Progress and results of one bulk upload"""
+
+    def __init__(self, rows: List[Dict], class_id: str = ''):
+        self.id = uuid.uuid4().hex[:8]
+        self.rows = rows
+        self.class_id = class_id
+        self.status = 'queued'
+        self.done = 0
+        self.results: List[Dict] = []
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.cancelled = False
+        self._csv: Optional[bytes] = None
+
+    @property
+    def total(self) -> int:
+        return len(self.rows)
+
+    @property
+    def progress(self) -> float:
+        return self.done / self.total if self.total else 1.0
+
+    @property
+    def active(self) -> bool:
+        return self.status in ('queued', 'running')
+
+    def results_csv(self) -> bytes:
+        """Downloadable results: one line per submitted text (built once when done)"""
+        if self._csv is not None:
+            return self._csv
+        done = self.status == 'done'
+        output = io.StringIO()
+        writer = csv.writer(output)
+        writer.writerow(['row', 'student_id', 'age', 'score', 'corrections', 'error_types',
+                         'original', 'corrected'])
+        for number, (row, result) in enumerate(zip(self.rows, self.results), 1):
+            error_types = Counter(c.type for c in result['corrections'])
+            writer.writerow([
+                number, row['student_id'], row['age'], result['score'], len(result['corrections']),
+                '; '.join(f"{error_type} x{count}" for error_type, count in error_types.most_common()),
+                result['original'], result['corrected']
+            ])
+        data = output.getvalue().encode('utf-8')
+        if done:
+            self._csv = data
+        return data
+
+
+class JobManager:
+    """Runs bulk jobs on a background pool shared by every session.
+
+    One manager lives for the whole server process, so jobs keep running and
+    stay visible across page reruns; a session only needs to remember its
+    job ids. Analysis is CPU-bound and holds the GIL, so after each row a
+    worker sleeps in proportion to the time the row took: each worker is busy
+    at most ``duty_cycle`` of the time. Interactive analysis on the script
+    thread still slows down while jobs run, but only by that share.
+    """
+
+    def __init__(self, analyzer: GrammarAnalyzer, history: Optional[HistoryStore] = None,
+                 max_workers: int = BULK_WORKERS, duty_cycle: float = BULK_DUTY_CYCLE):
+        self.analyzer = analyzer
+        self.history = history
+        self.duty_cycle = duty_cycle
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="bulk-grader")
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, rows: List[Dict], class_id: str = '') -> str:
+        """Start grading rows in the background and return the job id"""
+        job = Job(rows, class_id)
+        with self._lock:
+            self._forget_old_jobs()
+            self._jobs[job.id] = job
+        self._executor.submit(self._run, job)
+        return job.id
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> None:
+        job = self.get(job_id)
+        if job is not None:
+            job.cancelled = True
+
+    def _forget_old_jobs(self) -> None:
+        cutoff = time.time() - JOB_TTL
+        for job_id in [job_id for job_id, job in self._jobs.items()
+                       if job.finished_at is not None and job.finished_at < cutoff]:
+            del self._jobs[job_id]
+
+    def _run(self, job: Job) -> None:
+        job.status = 'running'
+        try:
+            for row in job.rows:
+                if job.cancelled:
+                    job.status = 'cancelled'
+                    return
+                started = time.perf_counter()
+                result = self.analyzer.analyze(row['text'], row['age'])
+                job.results.append(result)
+                if self.history is not None and row['student_id']:
+                    self.history.record(row['student_id'], result, job.class_id)
+                job.done += 1
+                # Rest so this worker is busy only duty_cycle of the time
+                busy = time.perf_counter() - started
+                time.sleep(busy * (1 / self.duty_cycle - 1))
+            job.status = 'done'
+        except Exception as e:
+            job.error = str(e)
+            job.status = 'failed'
+        finally:
+            job.finished_at = time.time()
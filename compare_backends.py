@@ -0,0 +1,71 @@
+"""
+Backend Comparison - quantized T5 backends against the fp32 model on JFLEG eval
+Reports how often each backend's output matches fp32 and its per-sentence latency
+
+Run with:
+    python compare_backends.py --model t5-demo --limit 200
+"""
+
+import argparse
+import statistics
+import time
+from difflib import SequenceMatcher
+from typing import Dict, List, Sequence
+from corpus import JFLEG_PATHS, iter_jfleg_pairs
+from ml_corrector import BACKENDS, DEFAULT_MODEL_DIR, Seq2SeqCorrector
+
+
+def timed_corrections(corrector: Seq2SeqCorrector, sentences: Sequence[str]) -> Dict:
+    """Corrections one sentence at a time (as the server sees them) with latencies"""
+    corrector.correct(sentences[0])  # warm-up
+    outputs: List[str] = []
+    latencies: List[float] = []
+    for sentence in sentences:
+        started = time.perf_counter()
+        outputs.append(corrector.correct(sentence))
+        latencies.append(time.perf_counter() - started)
+    return {'outputs': outputs, 'latencies': latencies}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare T5 inference backends on JFLEG eval")
+    parser.add_argument("--model", default=DEFAULT_MODEL_DIR, help="Fine-tuned model directory")
+    parser.add_argument("--limit", type=int, default=200, help="Number of eval sentences")
+    parser.add_argument("--threads", type=int, default=None, help="torch intra-op threads")
+    args = parser.parse_args()
+
+    if args.threads:
+        import torch
+        torch.set_num_threads(args.threads)
+
+    sentences = sorted({source for source, _ in iter_jfleg_pairs(JFLEG_PATHS[1:]) if source})
+    sentences = sentences[:args.limit]
+    results = {}
+    for backend in BACKENDS:
+        # No cache: every call must really run the model
+        results[backend] = timed_corrections(Seq2SeqCorrector(args.model, backend=backend), sentences)
+
+    baseline = results['torch']
+    base_latency = statistics.mean(baseline['latencies'])
+    print(f"{len(sentences)} JFLEG eval sentences, model {args.model}")
+    print(f"{'backend':<12}{'exact match':>12}{'similarity':>12}{'mean ms':>10}{'p95 ms':>10}{'speedup':>9}")
+    for backend, result in results.items():
+        exact = sum(a == b for a, b in zip(result['outputs'], baseline['outputs'])) / len(sentences)
+        similarity = statistics.mean(SequenceMatcher(None, a, b).ratio()
+                                     for a, b in zip(result['outputs'], baseline['outputs']))
+        latencies = sorted(result['latencies'])
+        mean = statistics.mean(latencies)
+        p95 = latencies[int(0.95 * (len(latencies) - 1))]
+        print(f"{backend:<12}{exact:>12.1%}{similarity:>12.3f}{mean * 1000:>10.1f}"
+              f"{p95 * 1000:>10.1f}{base_latency / mean:>8.2f}x")
+
+    # A few sentences where the quantized outputs differ, for a manual check
+    for backend in BACKENDS[1:]:
+        differing = [(s, b, q) for s, b, q in zip(sentences, baseline['outputs'], results[backend]['outputs'])
+                     if b != q][:3]
+        for sentence, fp32, quantized in differing:
+            print(f"\n[{backend}] {sentence}\n  fp32: {fp32}\n  int8: {quantized}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Bundled Corpora - readers for the JFLEG and FCE data shipped with the repo
+Plain csv/tsv readers so offline index builds need no extra packages
+"""
+
+import csv
+import os
+import re
+from typing import Iterable, Iterator, List, Tuple
+
+DATA_DIR = os.path.dirname(os.path.abspath(__file__))
+JFLEG_PATHS = (
+    os.path.join(DATA_DIR, "jfleg-dataset/versions/1/train.csv"),
+    os.path.join(DATA_DIR, "jfleg-dataset/versions/1/eval.csv"),
+)
+FCE_PATHS = tuple(
+    os.path.join(DATA_DIR, f"fce-error-detection/fce-error-detection/tsv/fce-public.{split}.original.tsv")
+    for split in ("train", "dev", "test")
+)
+
+WORD_RE = re.compile(r"[A-Za-z]+")
+
+def tokenize_words(text: str) -> List[str]:
+    """Lowercased alphabetic tokens of a sentence"""
+    return [word.lower() for word in WORD_RE.findall(text)]
+
+def iter_jfleg_pairs(paths: Iterable[str] = JFLEG_PATHS) -> Iterator[Tuple[str, str]]:
+    """(input, target) sentence pairs from the JFLEG csv files"""
+    for path in paths:
+        with open(path, newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                yield row['input'].strip(), row['target'].strip()
+
+def iter_jfleg_targets(paths: Iterable[str] = JFLEG_PATHS) -> Iterator[str]:
+    """Corrected (target) sentences from JFLEG"""
+    for _, target in iter_jfleg_pairs(paths):
+        if target:
+            yield target
+
+def iter_fce_sentences(paths: Iterable[str] = FCE_PATHS) -> Iterator[List[Tuple[str, str]]]:
+    """FCE sentences as lists of (token, label) pairs, label 'c' or 'i'"""
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            sentence = []
+            for line in f:
+                line = line.rstrip('\n')
+                if not line:
+                    if sentence:
+                        yield sentence
+                    sentence = []
+                    continue
+                token, _, label = line.partition('\t')
+                sentence.append((token, label))
+            if sentence:
+                yield sentence
+
+def iter_fce_correct_tokens(paths: Iterable[str] = FCE_PATHS) -> Iterator[str]:
+    """Lowercased alphabetic FCE tokens labelled correct ('c')"""
+    for sentence in iter_fce_sentences(paths):
+        for token, label in sentence:
+            if label == 'c' and token.isalpha() and token.isascii():
+                yield token.lower()
+
+def iter_fce_correct_sentences(paths: Iterable[str] = FCE_PATHS) -> Iterator[List[str]]:
+    """FCE sentences with no token labelled incorrect, as token lists"""
+    for sentence in iter_fce_sentences(paths):
+        if all(label == 'c' for _, label in sentence):
+            yield [token for token, _ in sentence]
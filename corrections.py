@@ -0,0 +1,264 @@
+"""
+Correction Records - compact storage for detected errors
+Slotted single corrections, columnar batches and fast JSON/binary encoders
+"""
+
+import json
+import struct
+import sys
+from array import array
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+# Interned category tables: records store small integer codes into these
+ERROR_TYPES: List[str] = []
+TYPE_CODES: Dict[str, int] = {}
+EXPLANATIONS: Dict[str, str] = {}
+SEVERITIES = ('high', 'medium', 'low')
+SEVERITY_CODES = {name: code for code, name in enumerate(SEVERITIES)}
+DEFAULT_EXPLANATION = "This needs to be corrected for proper English."
+
+def register_error_type(name: str, explanation: str = DEFAULT_EXPLANATION) -> int:
+    """Add an error type (and its explanation template) to the shared table"""
+    if name not in TYPE_CODES:
+        TYPE_CODES[name] = len(ERROR_TYPES)
+        ERROR_TYPES.append(sys.intern(name))
+    EXPLANATIONS[name] = explanation
+    return TYPE_CODES[name]
+
+# '{original}' is filled in with the text that was flagged
+register_error_type('Grammar', "This is a common grammar mistake. Practice makes perfect!")
+register_error_type('Subject-Verb Agreement', "'{original}' doesn't match. Remember: I am, You are, He/She/It is!")
+register_error_type('Article Usage', "Use 'an' before vowel sounds (a, e, i, o, u) and 'a' before consonant sounds.")
+register_error_type('Word Confusion', "These words sound similar but mean different things. Check the meaning!")
+register_error_type('Contractions', "Don't forget the apostrophe (') when combining words!")
+register_error_type('Comparatives', "Don't use 'more' with words that already show comparison like 'better'.")
+register_error_type('Modal Verbs', "Use 'have' not 'of' after words like should, could, would.")
+register_error_type('Sentence Structure', 'Complete sentences need a subject (who or what is doing the action)')
+register_error_type('Sentence Length', 'Long sentences can be hard to read. Try shorter ones!')
+register_error_type('Spelling', "'{original}' isn't spelled quite right. Check the letters carefully!")
+
+
+class Correction:
+    """A single detected error.
+
+    Category values are stored as codes into the shared tables and the span
+    as two ints, so a record costs a few machine words plus its two strings.
+    The explanation is rendered from the type's template on access.
+    """
+    __slots__ = ('type_code', 'severity_code', 'start', 'end', 'original', 'suggestion', 'rule_id')
+
+    def __init__(self, error_type: str, original: str, suggestion: str,
+                 position: Tuple[int, int], severity: str = 'medium', rule_id: int = -1):
+        self.type_code = TYPE_CODES[error_type]
+        self.severity_code = SEVERITY_CODES[severity]
+        self.start, self.end = position
+        self.original = original
+        self.suggestion = suggestion
+        self.rule_id = rule_id
+
+    @classmethod
+    def from_codes(cls, type_code: int, severity_code: int, start: int, end: int,
+                   original: str, suggestion: str, rule_id: int = -1) -> 'Correction':
+        """Build a record from already-interned codes (no table lookups)"""
+        correction = cls.__new__(cls)
+        correction.type_code = type_code
+        correction.severity_code = severity_code
+        correction.start = start
+        correction.end = end
+        correction.original = original
+        correction.suggestion = suggestion
+        correction.rule_id = rule_id
+        return correction
+
+    @property
+    def type(self) -> str:
+        return ERROR_TYPES[self.type_code]
+
+    @property
+    def severity(self) -> str:
+        return SEVERITIES[self.severity_code]
+
+    @property
+    def position(self) -> Tuple[int, int]:
+        return (self.start, self.end)
+
+    @property
+    def explanation(self) -> str:
+        template = EXPLANATIONS.get(self.type, DEFAULT_EXPLANATION)
+        return template.replace('{original}', self.original)
+
+    def to_dict(self) -> Dict:
+        """Plain dict form, e.g. for JSON APIs"""
+        return {
+            'type': self.type,
+            'original': self.original,
+            'suggestion': self.suggestion,
+            'position': self.position,
+            'explanation': self.explanation,
+            'severity': self.severity
+        }
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Correction):
+            return NotImplemented
+        return (self.type_code, self.severity_code, self.start, self.end,
+                self.original, self.suggestion, self.rule_id) == \
+               (other.type_code, other.severity_code, other.start, other.end,
+                other.original, other.suggestion, other.rule_id)
+
+    def __repr__(self) -> str:
+        return (f"Correction({self.type!r}, {self.original!r}, {self.suggestion!r}, "
+                f"{self.position}, {self.severity!r})")
+
+
+# Binary layout: header, then the numeric columns, then both string columns
+BATCH_MAGIC = b'KECB'
+BATCH_HEADER = struct.Struct('<4sHII')
+BATCH_VERSION = 1
+
+def _le_bytes(column: array) -> bytes:
+    """Column bytes in little-endian order"""
+    if sys.byteorder == 'little':
+        return column.tobytes()
+    swapped = array(column.typecode, column)
+    swapped.byteswap()
+    return swapped.tobytes()
+
+def _read_column(typecode: str, data: memoryview, offset: int, count: int) -> Tuple[array, int]:
+    column = array(typecode)
+    size = column.itemsize * count
+    column.frombytes(data[offset:offset + size])
+    if sys.byteorder != 'little':
+        column.byteswap()
+    return column, offset + size
+
+def _encode_strings(values: Sequence[str]) -> bytes:
+    encoded = [value.encode('utf-8') for value in values]
+    lengths = array('I', [len(value) for value in encoded])
+    return _le_bytes(lengths) + b''.join(encoded)
+
+def _decode_strings(data: memoryview, offset: int, count: int) -> Tuple[List[str], int]:
+    lengths, offset = _read_column('I', data, offset, count)
+    values = []
+    for length in lengths:
+        values.append(bytes(data[offset:offset + length]).decode('utf-8'))
+        offset += length
+    return values, offset
+
+
+class CorrectionBatch:
+    """Columnar corrections for many texts.
+
+    Rows are stored column by column in typed arrays, grouped by text:
+    ``text_offsets[i]:text_offsets[i + 1]`` are the rows of text ``i``.
+    Indexing returns ``Correction`` records, and the whole batch encodes to
+    columnar JSON or a compact binary form without building per-row dicts.
+    """
+
+    def __init__(self):
+        self.text_offsets = array('I', [0])
+        self.type_codes = array('B')
+        self.severity_codes = array('B')
+        self.starts = array('I')
+        self.ends = array('I')
+        self.rule_ids = array('h')
+        self.originals: List[str] = []
+        self.suggestions: List[str] = []
+
+    def add_text(self, corrections: Sequence[Correction]) -> None:
+        """Append the corrections found in the next text"""
+        for c in corrections:
+            self.type_codes.append(c.type_code)
+            self.severity_codes.append(c.severity_code)
+            self.starts.append(c.start)
+            self.ends.append(c.end)
+            self.rule_ids.append(c.rule_id)
+            self.originals.append(c.original)
+            self.suggestions.append(c.suggestion)
+        self.text_offsets.append(len(self.type_codes))
+
+    @property
+    def text_count(self) -> int:
+        return len(self.text_offsets) - 1
+
+    def __len__(self) -> int:
+        return len(self.type_codes)
+
+    def __getitem__(self, row: int) -> Correction:
+        return Correction.from_codes(self.type_codes[row], self.severity_codes[row],
+                                     self.starts[row], self.ends[row],
+                                     self.originals[row], self.suggestions[row],
+                                     self.rule_ids[row])
+
+    def __iter__(self) -> Iterator[Correction]:
+        for row in range(len(self)):
+            yield self[row]
+
+    def for_text(self, index: int) -> List[Correction]:
+        """Corrections of one text, in detection order"""
+        return [self[row] for row in range(self.text_offsets[index], self.text_offsets[index + 1])]
+
+    def to_columns(self) -> Dict:
+        """Columnar dict: category tables once, then one list per column.
+
+        ``explanations[type]`` is the template for that type; '{original}'
+        in it stands for the row's ``original``.
+        """
+        return {
+            'error_types': ERROR_TYPES,
+            'severities': SEVERITIES,
+            'explanations': [EXPLANATIONS.get(name, DEFAULT_EXPLANATION) for name in ERROR_TYPES],
+            'text_offsets': self.text_offsets.tolist(),
+            'type': self.type_codes.tolist(),
+            'severity': self.severity_codes.tolist(),
+            'start': self.starts.tolist(),
+            'end': self.ends.tolist(),
+            'rule_id': self.rule_ids.tolist(),
+            'original': self.originals,
+            'suggestion': self.suggestions
+        }
+
+    def to_json(self) -> str:
+        """Columnar JSON (see ``to_columns``)"""
+        return json.dumps(self.to_columns(), ensure_ascii=False, separators=(',', ':'))
+
+    def to_bytes(self) -> bytes:
+        """Compact binary encoding (little-endian columns + UTF-8 strings)"""
+        header = BATCH_HEADER.pack(BATCH_MAGIC, BATCH_VERSION, self.text_count, len(self))
+        # Type names travel with the data since codes depend on registration order
+        return b''.join([
+            header,
+            _encode_strings(['\x1f'.join(ERROR_TYPES)]),
+            _le_bytes(self.text_offsets),
+            _le_bytes(self.type_codes),
+            _le_bytes(self.severity_codes),
+            _le_bytes(self.starts),
+            _le_bytes(self.ends),
+            _le_bytes(self.rule_ids),
+            _encode_strings(self.originals),
+            _encode_strings(self.suggestions)
+        ])
+
+    @classmethod
+    def from_bytes(cls, payload: bytes) -> 'CorrectionBatch':
+        """Decode a batch written by ``to_bytes``"""
+        data = memoryview(payload)
+        magic, version, text_count, rows = BATCH_HEADER.unpack_from(data)
+        if magic != BATCH_MAGIC or version != BATCH_VERSION:
+            raise ValueError("Not a correction batch (or unsupported version)")
+        offset = BATCH_HEADER.size
+        (type_names,), offset = _decode_strings(data, offset, 1)
+        batch = cls()
+        batch.text_offsets, offset = _read_column('I', data, offset, text_count + 1)
+        type_codes, offset = _read_column('B', data, offset, rows)
+        batch.severity_codes, offset = _read_column('B', data, offset, rows)
+        batch.starts, offset = _read_column('I', data, offset, rows)
+        batch.ends, offset = _read_column('I', data, offset, rows)
+        batch.rule_ids, offset = _read_column('h', data, offset, rows)
+        batch.originals, offset = _decode_strings(data, offset, rows)
+        batch.suggestions, offset = _decode_strings(data, offset, rows)
+        # Re-map type codes onto this process's table
+        remap = [register_error_type(name) if name not in TYPE_CODES else TYPE_CODES[name]
+                 for name in type_names.split('\x1f')]
+        batch.type_codes = array('B', [remap[code] for code in type_codes])
+        return batch
@@ -3,11 +3,31 @@ Enhanced English Assistant with Comprehensive Grammar Patterns
 Age-appropriate grammar checking with 150+ patterns
 """
 
+import os
 import streamlit as st
 import spacy
-import re
-from typing import List, Dict, Tuple
-from grammar_patterns import ALL_GRAMMAR_PATTERNS
+from typing import List, Dict, Optional
+from corrections import Correction
+from ngram_model import (
+    DEFAULT_MODEL_PATH,
+    NgramModel,
+    build_ngram_model,
+    corpus_sentences
+)
+from spelling_index import (
+    DEFAULT_INDEX_PATH,
+    SpellingIndex,
+    build_spelling_index,
+    index_words
+)
+from bulk_jobs import JobManager, parse_upload
+from analytics import batch_from_results, build_tables, error_type_counts
+from history_store import HistoryStore
+from grammar_analyzer import (
+    GrammarAnalyzer,
+    generate_detailed_feedback,
+    generate_targeted_suggestions
+)
 
 # Load spaCy model
 @st.cache_resource
@@ -18,277 +38,144 @@ def load_spacy_model():
         st.error("Please install: python -m spacy download en_core_web_lg")
         st.stop()
 
-nlp = load_spacy_model()
+# Spelling index (built once from the bundled corpora and wordfreq if it is missing)
+@st.cache_resource
+def load_spelling_index() -> SpellingIndex:
+    if not os.path.exists(DEFAULT_INDEX_PATH):
+        build_spelling_index(index_words())
+    return SpellingIndex(DEFAULT_INDEX_PATH)
 
-# Age-based pattern filtering
-def get_patterns_by_age(age: int) -> Dict[str, str]:
-    """Filter patterns based on user age"""
-    if age <= 10:
-        # Basic patterns for young children
-        basic_keywords = ['i\\s+are', 'you.*is', 'he.*are', 'she.*are', 'we.*is', 'they.*is',
-                         'dont', 'cant', 'wont', 'didnt', 'i\\s+', 'your.*happy', 'there.*house',
-                         'ba\\s+apple', 'an\\s+cat']
-        return {p: r for p, r in ALL_GRAMMAR_PATTERNS.items() 
-                if any(keyword in p.lower() for keyword in basic_keywords)}
-    
-    elif age <= 14:
-        # Intermediate patterns
-        exclude_advanced = ['i\\s+think', 'in\\s+my\\s+opinion', 'very\\s+unique', 
-                           'academic', 'formal']
-        return {p: r for p, r in ALL_GRAMMAR_PATTERNS.items() 
-                if not any(keyword in p.lower() for keyword in exclude_advanced)}
-    
-    else:
-        # All patterns for advanced users
-        return ALL_GRAMMAR_PATTERNS
+# N-gram model for ranking competing suggestions (built once if missing)
+@st.cache_resource
+def load_ngram_model() -> NgramModel:
+    if not os.path.exists(DEFAULT_MODEL_PATH):
+        build_ngram_model(corpus_sentences())
+    return NgramModel(DEFAULT_MODEL_PATH)
+
+# Shared analyzer: compiled rules + spaCy pipeline, safe to use from any thread
+@st.cache_resource
+def load_analyzer() -> GrammarAnalyzer:
+    return GrammarAnalyzer(load_spacy_model(), spelling=load_spelling_index(),
+                           language_model=load_ngram_model())
+
+analyzer = load_analyzer()
+
+# Learner history (writes happen on a background thread)
+@st.cache_resource
+def load_history_store() -> HistoryStore:
+    return HistoryStore()
+
+history = load_history_store()
+
+# Bulk grading runs on a background pool shared by all sessions
+@st.cache_resource
+def load_job_manager() -> JobManager:
+    return JobManager(load_analyzer(), history=load_history_store())
+
+jobs = load_job_manager()
 
 # Enhanced error detection
-def detect_comprehensive_errors(text: str, age: int = 12) -> List[Dict]:
+def detect_comprehensive_errors(text: str, age: int = 12) -> List[Correction]:
     """Detect errors using age-appropriate patterns"""
-    corrections = []
-    patterns = get_patterns_by_age(age)
-    
-    # Apply pattern matching
-    for pattern, replacement in patterns.items():
-        matches = list(re.finditer(pattern, text, re.IGNORECASE))
-        for match in matches:
-            try:
-                if callable(replacement):
-                    corrected = replacement(match)
-                else:
-                    corrected = re.sub(pattern, replacement, match.group(), flags=re.IGNORECASE)
-                
-                corrections.append({
-                    'type': get_error_type(pattern),
-                    'original': match.group().strip(),
-                    'suggestion': corrected.strip(),
-                    'position': match.span(),
-                    'explanation': get_explanation(pattern, match.group()),
-                    'severity': get_severity(pattern)
-                })
-            except Exception as e:
-                continue
-    
-    # SpaCy-based checks
-    doc = nlp(text)
-    corrections.extend(spacy_structure_check(doc))
-    
-    return corrections
+    return analyzer.detect(text, age)
 
-def get_error_type(pattern: str) -> str:
-    """Categorize error types based on pattern"""
-    if any(keyword in pattern.lower() for keyword in ['are', 'is', 'have', 'has']):
-        return 'Subject-Verb Agreement'
-    elif any(keyword in pattern.lower() for keyword in ['\\ba\\s', '\\ban\\s']):
-        return 'Article Usage'
-    elif any(keyword in pattern.lower() for keyword in ['your', 'its', 'there', 'to']):
-        return 'Word Confusion'
-    elif any(keyword in pattern.lower() for keyword in ['dont', 'cant', 'wont']):
-        return 'Contractions'
-    elif 'than' in pattern.lower() or 'better' in pattern.lower():
-        return 'Comparatives'
-    elif any(keyword in pattern.lower() for keyword in ['of', 'have']):
-        return 'Modal Verbs'
-    else:
-        return 'Grammar'
+def apply_comprehensive_corrections(text: str, age: int, corrections: List[Correction]) -> str:
+    """Apply all corrections to text"""
+    return analyzer.correct(text, age, corrections)
 
-def get_explanation(pattern: str, original: str) -> str:
-    """Generate kid-friendly explanations"""
-    explanations = {
-        'Subject-Verb Agreement': f"'{original}' doesn't match. Remember: I am, You are, He/She/It is!",
-        'Article Usage': f"Use 'an' before vowel sounds (a, e, i, o, u) and 'a' before consonant sounds.",
-        'Word Confusion': f"These words sound similar but mean different things. Check the meaning!",
-        'Contractions': f"Don't forget the apostrophe (') when combining words!",
-        'Comparatives': f"Don't use 'more' with words that already show comparison like 'better'.",
-        'Modal Verbs': f"Use 'have' not 'of' after words like should, could, would.",
-        'Grammar': f"This is a common grammar mistake. Practice makes perfect!"
-    }
-    
-    error_type = get_error_type(pattern)
-    return explanations.get(error_type, "This needs to be corrected for proper English.")
+# Long documents are analyzed window by window with live progress
+LONG_DOCUMENT_CHARS = 3000
 
-def get_severity(pattern: str) -> str:
-    """Determine error severity for scoring"""
-    high_severity = ['subject.*verb', 'are.*is', 'double.*negative']
-    medium_severity = ['article', 'contraction', 'word.*confusion']
+def analyze_long_document(text: str, age: int, engine: Optional[str] = None) -> Dict:
+    """Stream analysis of a long text, showing corrections as each part finishes"""
+    progress = st.progress(0.0, text="Reading your story... 📖")
+    score_box = st.empty()
+    live_slot = st.empty()
+    live = live_slot.container()
     
-    pattern_lower = pattern.lower()
-    if any(keyword in pattern_lower for keyword in high_severity):
-        return 'high'
-    elif any(keyword in pattern_lower for keyword in medium_severity):
-        return 'medium'
-    else:
-        return 'low'
-
-def spacy_structure_check(doc) -> List[Dict]:
-    """Additional spaCy-based structure checks"""
     corrections = []
-    
-    for sent in doc.sents:
-        sent_text = sent.text.strip()
-        
-        # Check for missing subjects
-        has_subject = any(token.dep_ == "nsubj" or token.dep_ == "nsubjpass" for token in sent)
-        has_verb = any(token.pos_ == "VERB" for token in sent)
+    corrected_parts = []
+    score = 0
+    for chunk in analyzer.analyze_stream(text, age, engine=engine):
+        corrections.extend(chunk.corrections)
+        corrected_parts.append(chunk.corrected)
+        score = chunk.score
         
-        if has_verb and not has_subject and len(sent_text.split()) > 3:
-            # Skip questions and imperatives
-            question_words = ['what', 'where', 'when', 'why', 'how', 'who', 'which']
-            if not any(sent_text.lower().startswith(word) for word in question_words):
-                corrections.append({
-                    'type': 'Sentence Structure',
-                    'original': sent_text,
-                    'suggestion': f"Add a subject: '{sent_text}'",
-                    'position': (sent.start_char, sent.end_char),
-                    'explanation': 'Complete sentences need a subject (who or what is doing the action)',
-                    'severity': 'high'
-                })
-        
-        # Check for run-on sentences (very simple check)
-        if len(sent_text.split()) > 25 and sent_text.count(',') < 2:
-            corrections.append({
-                'type': 'Sentence Length',
-                'original': sent_text[:50] + "..." if len(sent_text) > 50 else sent_text,
-                'suggestion': "Consider breaking this into shorter sentences",
-                'position': (sent.start_char, sent.end_char),
-                'explanation': 'Long sentences can be hard to read. Try shorter ones!',
-                'severity': 'low'
-            })
-    
-    return corrections
+        progress.progress(chunk.end / len(text),
+                          text=f"Checked {chunk.words_seen} words so far... 🤔")
+        score_box.markdown(f"**Score so far:** {score}/100 · "
+                           f"**Corrections found:** {len(corrections)}")
+        with live:
+            for correction in chunk.corrections:
+                st.markdown(f"• \"{correction.original}\" → "
+                            f"**\"{correction.suggestion}\"** ({correction.type})")
+    
+    # The full report below replaces the live view
+    progress.empty()
+    score_box.empty()
+    live_slot.empty()
+    
+    return {
+        'original': text,
+        'corrected': ''.join(corrected_parts),
+        'corrections': corrections,
+        'score': score,
+        'feedback': generate_detailed_feedback(score, corrections, age),
+        'suggestions': generate_targeted_suggestions(corrections, age),
+        'age': age
+    }
 
-def apply_comprehensive_corrections(text: str, age: int, corrections: List[Dict]) -> str:
-    """Apply all corrections to text"""
-    corrected = text
-    
-    # Apply pattern-based corrections first
-    patterns = get_patterns_by_age(age)  # Use age-appropriate patterns
-    for pattern, replacement in patterns.items():
-        try:
-            corrected = re.sub(pattern, replacement, corrected, flags=re.IGNORECASE)
-        except:
-            continue
-    
-    # Fix capitalization at sentence beginnings
-    sentences = re.split(r'([.!?]+)', corrected)
-    result = []
-    for i, part in enumerate(sentences):
-        if i % 2 == 0 and part.strip():  # Sentence content
-            part = part.strip()
-            if part:
-                part = part[0].upper() + part[1:] if len(part) > 1 else part.upper()
-        result.append(part)
-    
-    return ''.join(result)
+@st.cache_data(max_entries=50)
+def job_error_counts(job_id: str):
+    """Error types across a finished job (its results never change)"""
+    corrections, _ = build_tables(*batch_from_results(jobs.get(job_id).results))
+    return error_type_counts(corrections)
 
-def calculate_comprehensive_score(user_sentence: str, corrections: List[Dict]) -> int:
-    """Enhanced scoring based on error severity"""
-    user_words = user_sentence.split()
-    original_length = len(user_words)
-    if original_length == 0:
-        return 0
-    base_score = 100
-    severity_penalties = {'high': 15, 'medium': 10, 'low': 5}
-    total_penalty = sum(severity_penalties.get(c.get('severity', 'medium'), 10) 
-                       for c in corrections)
-    # Length bonus for complexity
-    length_bonus = min(15, original_length // 8)
-    # Variety bonus for using different words
-    unique_words = len(set(user_words))
-    variety_bonus = min(10, unique_words // 10)
-    final_score = max(0, min(100, base_score - total_penalty + length_bonus + variety_bonus))
-    return final_score
+def show_bulk_jobs():
+    """Progress and downloads for this session's bulk grading jobs"""
+    for job_id in reversed(st.session_state.get('bulk_jobs', [])):
+        job = jobs.get(job_id)
+        if job is None:
+            continue
+        st.markdown(f"**Job {job.id}** · {job.total} texts · {job.status}")
+        if job.active:
+            st.progress(job.progress, text=f"Graded {job.done} of {job.total}...")
+            if st.button("⏹️ Cancel", key=f"cancel-{job.id}"):
+                jobs.cancel(job.id)
+        elif job.status == 'done':
+            st.download_button("⬇️ Download results (CSV)", job.results_csv(),
+                               file_name=f"grading-{job.id}.csv", mime="text/csv",
+                               key=f"download-{job.id}")
+            st.markdown("Most common mistakes in this class set:")
+            st.bar_chart(job_error_counts(job.id), x='type', y='count')
+        elif job.status == 'failed':
+            st.error(f"Something went wrong: {job.error}")
 
-def generate_detailed_feedback(score: int, corrections: List[Dict], age: int) -> str:
-    """Generate age-appropriate detailed feedback"""
-    if age <= 10:
-        # Simple feedback for young children
-        if score >= 90:
-            feedback = "🌟 WOW! You're an amazing writer!"
-        elif score >= 75:
-            feedback = "😊 Great job! You're getting better!"
-        elif score >= 60:
-            feedback = "👍 Good work! Let's fix a few things."
-        else:
-            feedback = "🤗 Keep trying! You're learning!"
-    
-    elif age <= 14:
-        # More detailed feedback for middle schoolers
-        if score >= 90:
-            feedback = "🌟 Excellent writing! Your grammar is really strong."
-        elif score >= 75:
-            feedback = "😊 Good work! Just a few small grammar points to improve."
-        elif score >= 60:
-            feedback = "👍 Nice effort! Let's work on these grammar areas together."
-        else:
-            feedback = "📚 Keep practicing! Grammar takes time to master."
-    
-    else:
-        # Detailed feedback for advanced learners
-        if score >= 90:
-            feedback = "🌟 Outstanding! Your English demonstrates strong command of grammar."
-        elif score >= 75:
-            feedback = "😊 Well done! Minor corrections will polish your writing."
-        elif score >= 60:
-            feedback = "👍 Good foundation! Focus on these specific grammar points."
-        else:
-            feedback = "📖 Solid effort! These corrections will strengthen your writing."
-    
-    error_count = len(corrections)
-    if error_count > 0:
-        feedback += f" I found {error_count} area{'s' if error_count > 1 else ''} to improve."
-    
-    return feedback
+# Refresh just the job list every few seconds, without rerunning the whole page
+if hasattr(st, 'fragment'):
+    show_bulk_jobs = st.fragment(run_every=2)(show_bulk_jobs)
 
-def generate_targeted_suggestions(corrections: List[Dict], age: int) -> List[str]:
-    """Generate specific suggestions based on error types found"""
-    suggestions = []
-    error_types = [c.get('type', 'Grammar') for c in corrections]
-    
-    # Suggestions based on error patterns
-    if 'Subject-Verb Agreement' in error_types:
-        if age <= 10:
-            suggestions.append("🗣️ Say your sentence out loud. Does it sound right?")
-        else:
-            suggestions.append("📝 Practice matching subjects with verbs: I am, You are, He/She is")
-    
-    if 'Article Usage' in error_types:
-        if age <= 10:
-            suggestions.append("🔤 Remember: 'an apple' but 'a banana'")
-        else:
-            suggestions.append("📖 Use 'an' before vowel sounds and 'a' before consonant sounds")
-    
-    if 'Word Confusion' in error_types:
-        suggestions.append("📚 Make flashcards for confusing words like your/you're, its/it's")
-    
-    if 'Contractions' in error_types:
-        suggestions.append("✍️ Don't forget apostrophes in contractions: don't, can't, won't")
-    
-    if 'Sentence Structure' in error_types:
-        if age <= 10:
-            suggestions.append("🏗️ Every sentence needs someone doing something!")
-        else:
-            suggestions.append("🔧 Check that each sentence has a subject and predicate")
-    
-    # General suggestions if no specific errors
-    if not suggestions:
-        if age <= 10:
-            suggestions.extend([
-                "⭐ Try writing about your favorite things!",
-                "📖 Read books to see how good sentences look!"
-            ])
-        elif age <= 14:
-            suggestions.extend([
-                "📚 Read your writing aloud to catch mistakes",
-                "✨ Try using more descriptive words in your sentences"
-            ])
-        else:
-            suggestions.extend([
-                "📖 Consider varying your sentence structure for better flow",
-                "🎯 Focus on precision in word choice and grammar"
-            ])
-    
-    return suggestions[:3]  # Limit to 3 suggestions
+def bulk_grading_section(age: int, class_code: str):
+    """Teacher upload form; grading continues in the background"""
+    st.markdown("---")
+    with st.expander("👩‍🏫 Teacher Tools: Grade a Whole Class"):
+        st.markdown("Upload a **CSV** or **JSONL** file with a `text` column "
+                    "(and optionally `student_id` and `age`). You can keep using the app while it runs.")
+        upload = st.file_uploader("Class set", type=['csv', 'jsonl'])
+        if upload is not None and st.button("📚 Start Grading"):
+            try:
+                rows = parse_upload(upload.name, upload.getvalue(), default_age=age)
+            except ValueError as e:
+                st.error(str(e))
+            else:
+                job_id = jobs.submit(rows, class_code.strip())
+                st.session_state.setdefault('bulk_jobs', []).append(job_id)
+                st.success(f"Started job {job_id} with {len(rows)} texts!")
+        
+        if st.session_state.get('bulk_jobs'):
+            show_bulk_jobs()
+            if not hasattr(st, 'fragment'):
+                st.button("🔄 Refresh progress")
 
 # Enhanced Streamlit Interface
 def main():
@@ -337,6 +224,21 @@ def main():
                 unsafe_allow_html=True)
     st.markdown("### AI-powered grammar checker with 150+ rules, personalized for your age!")
     
+    # Learner identity for progress tracking
+    with st.sidebar:
+        st.markdown("### 📈 Track My Progress")
+        student_name = st.text_input("🧒 Your name", help="Leave empty to skip saving your progress")
+        class_code = st.text_input("🏫 Class code (optional)")
+        
+        with st.expander("⚙️ Settings"):
+            engine = st.radio(
+                "Rule matching",
+                options=['regex', 'token'],
+                format_func={'regex': "Text patterns (classic)",
+                             'token': "spaCy tokens (reuses the parse)"}.get,
+                help="Both find the same mistakes; the token matcher works on the words spaCy already found"
+            )
+    
     # Age selector
     st.markdown('<div class="age-selector">', unsafe_allow_html=True)
     col1, col2, col3 = st.columns([1, 2, 1])
@@ -393,37 +295,30 @@ def main():
             st.markdown("• Use precise vocabulary")
     
     # Analysis button
+    analyze_long = False
+    analyzed = False
     col1, col2, col3 = st.columns([1, 1, 1])
     with col2:
         if st.button("🔍 Analyze My Writing!", type="primary", use_container_width=True):
-            if user_input.strip():
+            if len(user_input) > LONG_DOCUMENT_CHARS:
+                # Long documents are streamed below, at full width
+                analyze_long = True
+            elif user_input.strip():
                 with st.spinner("Analyzing your writing... 🤔"):
-                    # Detect errors with age-appropriate patterns
-                    corrections = detect_comprehensive_errors(user_input, age)
-                    
-                    # Apply corrections
-                    corrected_text = apply_comprehensive_corrections(user_input, age, corrections)
-                    
-                    # Calculate score
-                    score = calculate_comprehensive_score(user_input, corrections)
-                    
-                    # Generate feedback
-                    feedback = generate_detailed_feedback(score, corrections, age)
-                    suggestions = generate_targeted_suggestions(corrections, age)
-                    
-                    # Store results
-                    st.session_state.result = {
-                        'original': user_input,
-                        'corrected': corrected_text,
-                        'corrections': corrections,
-                        'score': score,
-                        'feedback': feedback,
-                        'suggestions': suggestions,
-                        'age': age
-                    }
+                    # Detect, correct, score and give feedback in one pass
+                    st.session_state.result = analyzer.analyze(user_input, age, engine)
+                    analyzed = True
             else:
                 st.warning("Please write something first! 😊")
     
+    if analyze_long:
+        st.session_state.result = analyze_long_document(user_input, age, engine)
+        analyzed = True
+    
+    # Save to the learner's history (only queued here, so it costs no time)
+    if analyzed and student_name.strip():
+        history.record(student_name.strip(), st.session_state.result, class_code.strip())
+    
     # Results display
     if hasattr(st.session_state, 'result') and st.session_state.result:
         result = st.session_state.result
@@ -470,7 +365,7 @@ def main():
             # Group corrections by type
             corrections_by_type = {}
             for correction in result['corrections']:
-                error_type = correction.get('type', 'Grammar')
+                error_type = correction.type
                 if error_type not in corrections_by_type:
                     corrections_by_type[error_type] = []
                 corrections_by_type[error_type].append(correction)
@@ -479,7 +374,7 @@ def main():
                 st.markdown(f"#### {error_type} ({len(corrections)} error{'s' if len(corrections) > 1 else ''})")
                 
                 for i, correction in enumerate(corrections, 1):
-                    severity = correction.get('severity', 'medium')
+                    severity = correction.severity
                     severity_class = f"error-severity-{severity}"
                     
                     severity_emoji = {"high": "🔴", "medium": "🟡", "low": "🟢"}
@@ -488,9 +383,9 @@ def main():
                         f"""
                         <div class="{severity_class}" style="padding: 1rem; margin: 0.5rem 0; border-radius: 8px;">
                             <h5>{severity_emoji[severity]} Correction #{i}</h5>
-                            <p><strong>Change:</strong> "{correction['original']}" 
-                            <span style="color: green; font-weight: bold;">→ "{correction['suggestion']}"</span></p>
-                            <p><strong>Explanation:</strong> {correction['explanation']}</p>
+                            <p><strong>Change:</strong> "{correction.original}" 
+                            <span style="color: green; font-weight: bold;">→ "{correction.suggestion}"</span></p>
+                            <p><strong>Explanation:</strong> {correction.explanation}</p>
                         </div>
                         """,
                         unsafe_allow_html=True
@@ -506,11 +401,29 @@ def main():
             st.balloons()
             st.success("🎉 Perfect! No corrections needed!")
         
+        # Progress across sessions
+        if student_name.strip():
+            top_errors = history.top_error_types(student_name.strip(), days=90)
+            scores = [score for _, score in history.score_history(student_name.strip(), days=90)]
+            if top_errors or scores:
+                st.markdown("### 📈 Your Progress (last 90 days)")
+                col1, col2 = st.columns(2)
+                with col1:
+                    st.markdown("**Things to practice most:**")
+                    for error_type, count in top_errors:
+                        st.markdown(f"• {error_type}: {count} time{'s' if count > 1 else ''}")
+                with col2:
+                    if len(scores) > 1:
+                        st.markdown("**Your scores over time:**")
+                        st.line_chart(scores)
+        
         # Clear button
         if st.button("🔄 Try Another Text", type="secondary"):
             if hasattr(st.session_state, 'result'):
                 del st.session_state.result
             st.rerun()
+    
+    bulk_grading_section(age, class_code)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
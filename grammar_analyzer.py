@@ -0,0 +1,710 @@
+"""
+Grammar Analyzer - shared, read-only analysis engine
+Compiles the grammar patterns once and serves many threads from one loaded model
+"""
+
+import re
+from bisect import bisect_left, bisect_right
+from types import MappingProxyType
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple, Union
+from grammar_patterns import ALL_GRAMMAR_PATTERNS
+from corrections import (
+    Correction,
+    CorrectionBatch,
+    EXPLANATIONS,
+    DEFAULT_EXPLANATION,
+    SEVERITY_CODES,
+    TYPE_CODES
+)
+from ngram_model import NgramModel
+from spelling_index import SpellingIndex
+from token_rules import ENGINES, TokenRuleEngine
+
+# Age-based pattern filtering
+BASIC_KEYWORDS = ('i\\s+are', 'you.*is', 'he.*are', 'she.*are', 'we.*is', 'they.*is',
+                  'dont', 'cant', 'wont', 'didnt', 'i\\s+', 'your.*happy', 'there.*house',
+                  'ba\\s+apple', 'an\\s+cat')
+ADVANCED_KEYWORDS = ('i\\s+think', 'in\\s+my\\s+opinion', 'very\\s+unique',
+                     'academic', 'formal')
+
+def get_age_band(age: int) -> str:
+    """Map a user age to the pattern level used for them"""
+    if age <= 10:
+        return 'beginner'
+    elif age <= 14:
+        return 'intermediate'
+    else:
+        return 'advanced'
+
+def get_patterns_by_age(age: int) -> Dict[str, str]:
+    """Filter patterns based on user age"""
+    band = get_age_band(age)
+    if band == 'beginner':
+        # Basic patterns for young children
+        return {p: r for p, r in ALL_GRAMMAR_PATTERNS.items()
+                if any(keyword in p.lower() for keyword in BASIC_KEYWORDS)}
+    elif band == 'intermediate':
+        # Intermediate patterns
+        return {p: r for p, r in ALL_GRAMMAR_PATTERNS.items()
+                if not any(keyword in p.lower() for keyword in ADVANCED_KEYWORDS)}
+    else:
+        # All patterns for advanced users
+        return ALL_GRAMMAR_PATTERNS
+
+def get_error_type(pattern: str) -> str:
+    """Categorize error types based on pattern"""
+    if any(keyword in pattern.lower() for keyword in ['are', 'is', 'have', 'has']):
+        return 'Subject-Verb Agreement'
+    elif any(keyword in pattern.lower() for keyword in ['\\ba\\s', '\\ban\\s']):
+        return 'Article Usage'
+    elif any(keyword in pattern.lower() for keyword in ['your', 'its', 'there', 'to']):
+        return 'Word Confusion'
+    elif any(keyword in pattern.lower() for keyword in ['dont', 'cant', 'wont']):
+        return 'Contractions'
+    elif 'than' in pattern.lower() or 'better' in pattern.lower():
+        return 'Comparatives'
+    elif any(keyword in pattern.lower() for keyword in ['of', 'have']):
+        return 'Modal Verbs'
+    else:
+        return 'Grammar'
+
+def get_explanation(pattern: str, original: str) -> str:
+    """Generate kid-friendly explanations"""
+    error_type = get_error_type(pattern)
+    template = EXPLANATIONS.get(error_type, DEFAULT_EXPLANATION)
+    return template.replace('{original}', original)
+
+def get_severity(pattern: str) -> str:
+    """Determine error severity for scoring"""
+    high_severity = ['subject.*verb', 'are.*is', 'double.*negative']
+    medium_severity = ['article', 'contraction', 'word.*confusion']
+
+    pattern_lower = pattern.lower()
+    if any(keyword in pattern_lower for keyword in high_severity):
+        return 'high'
+    elif any(keyword in pattern_lower for keyword in medium_severity):
+        return 'medium'
+    else:
+        return 'low'
+
+def spacy_structure_check(doc) -> List[Correction]:
+    """Additional spaCy-based structure checks"""
+    corrections = []
+
+    for sent in doc.sents:
+        sent_text = sent.text.strip()
+
+        # Check for missing subjects
+        has_subject = any(token.dep_ == "nsubj" or token.dep_ == "nsubjpass" for token in sent)
+        has_verb = any(token.pos_ == "VERB" for token in sent)
+
+        if has_verb and not has_subject and len(sent_text.split()) > 3:
+            # Skip questions and imperatives
+            question_words = ['what', 'where', 'when', 'why', 'how', 'who', 'which']
+            if not any(sent_text.lower().startswith(word) for word in question_words):
+                corrections.append(Correction(
+                    'Sentence Structure',
+                    sent_text,
+                    f"Add a subject: '{sent_text}'",
+                    (sent.start_char, sent.end_char),
+                    'high'
+                ))
+
+        # Check for run-on sentences (very simple check)
+        if len(sent_text.split()) > 25 and sent_text.count(',') < 2:
+            corrections.append(Correction(
+                'Sentence Length',
+                sent_text[:50] + "..." if len(sent_text) > 50 else sent_text,
+                "Consider breaking this into shorter sentences",
+                (sent.start_char, sent.end_char),
+                'low'
+            ))
+
+    return corrections
+
+def capitalize_sentences(text: str) -> str:
+    """Fix capitalization at sentence beginnings"""
+    sentences = re.split(r'([.!?]+)', text)
+    result = []
+    for i, part in enumerate(sentences):
+        if i % 2 == 0 and part.strip():  # Sentence content
+            part = part.strip()
+            if part:
+                part = part[0].upper() + part[1:] if len(part) > 1 else part.upper()
+        result.append(part)
+
+    return ''.join(result)
+
+# Long-document streaming
+WINDOW_CHARS = 2000
+SENTENCE_END = re.compile(r'[.!?]+(?=\s)\s*')
+WHITESPACE = re.compile(r'\s+')
+
+def _window_end(text: str, start: int, max_chars: int) -> int:
+    """End of the window starting at ``start``, preferring sentence boundaries"""
+    limit = start + max_chars
+    if limit >= len(text):
+        return len(text)
+    end = 0
+    # Scan one character past the limit: the lookahead needs the whitespace
+    # after a "." that ends exactly there (so the window may take that space)
+    for match in SENTENCE_END.finditer(text, start, limit + 1):
+        end = match.end()
+    if end > start:
+        return end
+    # One very long sentence: cut at the last whitespace instead
+    for match in WHITESPACE.finditer(text, start, limit):
+        end = match.end()
+    return end if end > start else limit
+
+def iter_sentence_windows(text: str, max_chars: int = WINDOW_CHARS) -> Iterator[Tuple[int, int]]:
+    """Yield (start, end) offsets of consecutive windows of whole sentences"""
+    start = 0
+    while start < len(text):
+        end = _window_end(text, start, max_chars)
+        yield start, end
+        start = end
+
+def shift_correction(correction: Correction, offset: int) -> Correction:
+    """Move a window-relative correction to document offsets"""
+    correction.start += offset
+    correction.end += offset
+    return correction
+
+SEVERITY_PENALTIES = {'high': 15, 'medium': 10, 'low': 5}
+
+def correction_penalty(correction: Correction) -> int:
+    """Score penalty for a single correction"""
+    return SEVERITY_PENALTIES.get(correction.severity, 10)
+
+def score_from_counts(word_count: int, unique_count: int, total_penalty: int) -> int:
+    """Score from word counts and accumulated penalties"""
+    if word_count == 0:
+        return 0
+    base_score = 100
+    # Length bonus for complexity
+    length_bonus = min(15, word_count // 8)
+    # Variety bonus for using different words
+    variety_bonus = min(10, unique_count // 10)
+    return max(0, min(100, base_score - total_penalty + length_bonus + variety_bonus))
+
+def calculate_comprehensive_score(user_sentence: str, corrections: List[Correction]) -> int:
+    """Enhanced scoring based on error severity"""
+    user_words = user_sentence.split()
+    total_penalty = sum(correction_penalty(c) for c in corrections)
+    return score_from_counts(len(user_words), len(set(user_words)), total_penalty)
+
+def generate_detailed_feedback(score: int, corrections: List[Correction], age: int) -> str:
+    """Generate age-appropriate detailed feedback"""
+    if age <= 10:
+        # Simple feedback for young children
+        if score >= 90:
+            feedback = "🌟 WOW! You're an amazing writer!"
+        elif score >= 75:
+            feedback = "😊 Great job! You're getting better!"
+        elif score >= 60:
+            feedback = "👍 Good work! Let's fix a few things."
+        else:
+            feedback = "🤗 Keep trying! You're learning!"
+
+    elif age <= 14:
+        # More detailed feedback for middle schoolers
+        if score >= 90:
+            feedback = "🌟 Excellent writing! Your grammar is really strong."
+        elif score >= 75:
+            feedback = "😊 Good work! Just a few small grammar points to improve."
+        elif score >= 60:
+            feedback = "👍 Nice effort! Let's work on these grammar areas together."
+        else:
+            feedback = "📚 Keep practicing! Grammar takes time to master."
+
+    else:
+        # Detailed feedback for advanced learners
+        if score >= 90:
+            feedback = "🌟 Outstanding! Your English demonstrates strong command of grammar."
+        elif score >= 75:
+            feedback = "😊 Well done! Minor corrections will polish your writing."
+        elif score >= 60:
+            feedback = "👍 Good foundation! Focus on these specific grammar points."
+        else:
+            feedback = "📖 Solid effort! These corrections will strengthen your writing."
+
+    error_count = len(corrections)
+    if error_count > 0:
+        feedback += f" I found {error_count} area{'s' if error_count > 1 else ''} to improve."
+
+    return feedback
+
+def generate_targeted_suggestions(corrections: List[Correction], age: int) -> List[str]:
+    """Generate specific suggestions based on error types found"""
+    suggestions = []
+    error_types = {c.type for c in corrections}
+
+    # Suggestions based on error patterns
+    if 'Subject-Verb Agreement' in error_types:
+        if age <= 10:
+            suggestions.append("🗣️ Say your sentence out loud. Does it sound right?")
+        else:
+            suggestions.append("📝 Practice matching subjects with verbs: I am, You are, He/She is")
+
+    if 'Article Usage' in error_types:
+        if age <= 10:
+            suggestions.append("🔤 Remember: 'an apple' but 'a banana'")
+        else:
+            suggestions.append("📖 Use 'an' before vowel sounds and 'a' before consonant sounds")
+
+    if 'Word Confusion' in error_types:
+        suggestions.append("📚 Make flashcards for confusing words like your/you're, its/it's")
+
+    if 'Spelling' in error_types:
+        if age <= 10:
+            suggestions.append("🔡 Sound out tricky words slowly, letter by letter")
+        else:
+            suggestions.append("📒 Keep a list of words you often misspell and practice them")
+
+    if 'Contractions' in error_types:
+        suggestions.append("✍️ Don't forget apostrophes in contractions: don't, can't, won't")
+
+    if 'Sentence Structure' in error_types:
+        if age <= 10:
+            suggestions.append("🏗️ Every sentence needs someone doing something!")
+        else:
+            suggestions.append("🔧 Check that each sentence has a subject and predicate")
+
+    # General suggestions if no specific errors
+    if not suggestions:
+        if age <= 10:
+            suggestions.extend([
+                "⭐ Try writing about your favorite things!",
+                "📖 Read books to see how good sentences look!"
+            ])
+        elif age <= 14:
+            suggestions.extend([
+                "📚 Read your writing aloud to catch mistakes",
+                "✨ Try using more descriptive words in your sentences"
+            ])
+        else:
+            suggestions.extend([
+                "📖 Consider varying your sentence structure for better flow",
+                "🎯 Focus on precision in word choice and grammar"
+            ])
+
+    return suggestions[:3]  # Limit to 3 suggestions
+
+
+# Spelling: lowercase words only, so names and sentence starts are left alone,
+# and never a piece of a contraction like "don't"
+SPELLING_WORD = re.compile(r"(?<![\w'’\\])[a-z]{3,}(?![\w'’\\])")
+SPELLING_TYPE = TYPE_CODES['Spelling']
+SPELLING_SEVERITY = SEVERITY_CODES['medium']
+SPELLING_CANDIDATES = 5
+# Short words are only corrected one edit away: at distance 2 nearly every
+# short word is close to some other word ("lego" -> "legs")
+SPELLING_SHORT_WORD = 5
+# Per-token log10 score a candidate needs over the most frequent one to win
+# ("your adress": address and dress score within 0.02 of each other)
+SPELLING_CONTEXT_MARGIN = 0.1
+
+def merge_spans(spans: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """Sorted, non-overlapping union of (start, end) spans"""
+    merged = []
+    for start, end in sorted(spans):
+        if merged and start < merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+# Suggestion ranking: candidates are scored inside this much surrounding text
+CONTEXT_CHARS = 30
+SENTENCE_LEVEL_TYPES = frozenset(TYPE_CODES[t] for t in ('Sentence Structure', 'Sentence Length'))
+
+def context_bounds(text: str, start: int, end: int, chars: int = CONTEXT_CHARS) -> Tuple[int, int]:
+    """Whole-word window of about ``chars`` characters either side of a span"""
+    left = text.rfind(' ', 0, max(0, start - chars)) + 1
+    right = text.find(' ', min(len(text), end + chars))
+    return left, len(text) if right == -1 else right
+
+def pattern_specificity(pattern: str) -> int:
+    """Literal letters in a pattern; escapes like \\s and character classes don't count"""
+    return sum(ch.isalpha() for ch in re.sub(r'\\[A-Za-z]|\[[^\]]*\]', '', pattern))
+
+def replace_spans(text: str, corrections: List[Correction]) -> str:
+    """Replace each (non-overlapping) correction span with its suggestion"""
+    parts = []
+    last = 0
+    for c in sorted(corrections, key=lambda c: c.start):
+        # Suggestions are stripped but a rule's span can end in whitespace
+        matched = text[c.start:c.end]
+        parts.append(text[last:c.start + len(matched) - len(matched.lstrip())])
+        parts.append(c.suggestion)
+        last = c.start + len(matched.rstrip())
+    parts.append(text[last:])
+    return ''.join(parts)
+
+
+class MaxPrefixTree:
+    """Fenwick tree of running maxima: raise a slot, query max of a prefix"""
+
+    def __init__(self, size: int):
+        self.tree = [-1] * (size + 1)
+
+    def update(self, index: int, value: int) -> None:
+        """Raise slot ``index`` to at least ``value``"""
+        index += 1
+        while index < len(self.tree):
+            if self.tree[index] < value:
+                self.tree[index] = value
+            index += index & -index
+
+    def max_before(self, count: int) -> int:
+        """Largest value in slots ``0 .. count - 1`` (-1 if none)"""
+        best = -1
+        while count > 0:
+            if self.tree[count] > best:
+                best = self.tree[count]
+            count -= count & -count
+        return best
+
+
+class Rule(NamedTuple):
+    """A compiled grammar pattern with its precomputed metadata"""
+    rule_id: int
+    pattern: str
+    regex: 're.Pattern'
+    replacement: Union[str, Callable]
+    type_code: int
+    severity_code: int
+
+
+def compile_rules(patterns: Dict[str, Union[str, Callable]]) -> Tuple[Rule, ...]:
+    """Compile a pattern table into immutable rules"""
+    return tuple(
+        Rule(rule_id, pattern, re.compile(pattern, re.IGNORECASE), replacement,
+             TYPE_CODES[get_error_type(pattern)], SEVERITY_CODES[get_severity(pattern)])
+        for rule_id, (pattern, replacement) in enumerate(patterns.items())
+    )
+
+
+class StreamChunk(NamedTuple):
+    """Progressive result for one window of a long document"""
+    start: int
+    end: int
+    corrections: List[Correction]
+    corrected: str
+    score: int
+    words_seen: int
+
+
+class GrammarAnalyzer:
+    """Read-only grammar analysis engine that is safe to share between threads.
+
+    Everything is built once in ``__init__``: the regex rules are compiled,
+    their type/severity metadata is precomputed and the rule set for each age
+    band is fixed as a tuple. After construction no attribute is ever
+    reassigned or mutated, so ``analyze`` keeps all per-call state in local
+    variables and any number of threads may call it concurrently. The spaCy
+    pipeline is only used for inference (``nlp(text)``) and is never
+    reconfigured, so one loaded model can serve a whole thread pool.
+
+    Rules can be matched by two engines: 'regex' scans the raw text, 'token'
+    matches the same rules on the tokens of the Doc that is parsed anyway.
+    ``engine`` is the default; every detection method can override it.
+    """
+
+    def __init__(self, nlp, patterns: Optional[Dict[str, str]] = None,
+                 spelling: Optional[SpellingIndex] = None,
+                 language_model: Optional[NgramModel] = None,
+                 engine: str = 'regex'):
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown rule engine {engine!r}, expected one of {ENGINES}")
+        self.nlp = nlp
+        self.engine = engine
+        # Memory-mapped and read-only; None disables spelling checks / ranking
+        self.spelling = spelling
+        self.language_model = language_model
+        patterns = ALL_GRAMMAR_PATTERNS if patterns is None else patterns
+        rules = compile_rules(patterns)
+        # Rule ids are positions in ``rules``, so this is indexed by rule_id
+        self.rule_specificity = tuple(pattern_specificity(r.pattern) for r in rules)
+        # Age bands share the compiled Rule objects, only the selection differs
+        self.rules_by_band = MappingProxyType({
+            'beginner': tuple(r for r in rules
+                              if any(k in r.pattern.lower() for k in BASIC_KEYWORDS)),
+            'intermediate': tuple(r for r in rules
+                                  if not any(k in r.pattern.lower() for k in ADVANCED_KEYWORDS)),
+            'advanced': rules,
+        })
+        self.token_engine = TokenRuleEngine(nlp, rules)
+
+    def rules_for_age(self, age: int) -> Tuple[Rule, ...]:
+        """Age-appropriate compiled rules"""
+        return self.rules_by_band[get_age_band(age)]
+
+    def match_rules(self, text: str, age: int = 12) -> List[Correction]:
+        """Pattern-based corrections only (no spaCy)"""
+        corrections = []
+        for rule in self.rules_for_age(age):
+            for match in rule.regex.finditer(text):
+                try:
+                    if callable(rule.replacement):
+                        corrected = rule.replacement(match)
+                    else:
+                        corrected = rule.regex.sub(rule.replacement, match.group())
+
+                    start, end = match.span()
+                    corrections.append(Correction.from_codes(
+                        rule.type_code, rule.severity_code, start, end,
+                        match.group().strip(), corrected.strip(), rule.rule_id
+                    ))
+                except Exception:
+                    continue
+        return corrections
+
+    def match_spelling(self, text: str, covered: List[Correction] = ()) -> List[Correction]:
+        """Misspelled words, skipping any word already inside a ``covered`` span.
+
+        Only words the index doesn't know are flagged; short ones only when a
+        word one edit away exists.
+        """
+        if self.spelling is None:
+            return []
+        spans = merge_spans([c.position for c in covered])
+        span_starts = [start for start, _ in spans]
+        corrections = []
+        for match in SPELLING_WORD.finditer(text):
+            start, end = match.span()
+            i = bisect_right(span_starts, start) - 1
+            if (i >= 0 and spans[i][1] > start) or (i + 1 < len(spans) and spans[i + 1][0] < end):
+                continue
+            word = match.group()
+            candidates = self.spelling.lookup(word)
+            if not candidates or candidates[0].distance == 0:
+                continue
+            if len(word) <= SPELLING_SHORT_WORD and candidates[0].distance > 1:
+                continue
+            suggestion = candidates[0].term
+            if len(candidates) > 1 and self.language_model is not None:
+                # Equally close words ("wich": with/which/wish): let the context decide
+                left, right = context_bounds(text, start, end)
+                terms = [candidate.term for candidate in candidates[:SPELLING_CANDIDATES]]
+                rewrites = [text[left:start] + term + text[end:right] for term in terms]
+                scores = self.language_model.score_batch(rewrites)
+                best = max(range(len(terms)), key=scores.__getitem__)
+                # Candidates come most frequent first; the small corpus model
+                # only overrides that order when it clearly prefers another
+                if scores[best] - scores[0] > SPELLING_CONTEXT_MARGIN:
+                    suggestion = terms[best]
+            # The dictionary has words the rules correct ("donot" -> "dont")
+            suggestion = self._rule_rewrite(suggestion)
+            corrections.append(Correction.from_codes(
+                SPELLING_TYPE, SPELLING_SEVERITY, start, end, word, suggestion
+            ))
+        return corrections
+
+    def _rule_rewrite(self, word: str) -> str:
+        """``word`` as the first rule that matches all of it would correct it"""
+        for rule in self.rules_by_band['advanced']:
+            match = rule.regex.fullmatch(word)
+            if match is None:
+                continue
+            try:
+                corrected = (rule.replacement(match) if callable(rule.replacement)
+                             else rule.regex.sub(rule.replacement, word))
+            except Exception:
+                continue
+            return corrected.strip()
+        return word
+
+    def rank_suggestions(self, text: str, corrections: List[Correction]) -> List[Correction]:
+        """Order each group of overlapping corrections from most to least fluent.
+
+        Groups are found with one sort and a sweep; only groups that offer
+        different rewrites are scored, each with one batched model call.
+        Sentence-level checks are left where they are.
+        """
+        if self.language_model is None:
+            return corrections
+        spans = sorted((c for c in corrections if c.type_code not in SENTENCE_LEVEL_TYPES),
+                       key=lambda c: (c.start, c.end))
+        ranked = []
+        group = []
+        group_end = -1
+        for c in spans + [None]:
+            if c is not None and c.start < group_end:
+                group.append(c)
+                group_end = max(group_end, c.end)
+                continue
+            if len({g.suggestion for g in group}) > 1:
+                left, right = context_bounds(text, group[0].start, group_end)
+                rewrites = [text[left:g.start] + g.suggestion + text[g.end:right] for g in group]
+                scores = self.language_model.score_batch(rewrites)
+                group = [g for _, g in sorted(zip(scores, group), key=lambda pair: -pair[0])]
+            ranked.extend(group)
+            if c is not None:
+                group = [c]
+                group_end = c.end
+        ranked.extend(c for c in corrections if c.type_code in SENTENCE_LEVEL_TYPES)
+        return ranked
+
+    def _conflict_rank(self, item: Tuple[int, Correction]) -> Tuple[int, ...]:
+        """Sort key for overlapping corrections: best first"""
+        order, c = item
+        # Severity codes run high -> low. Within a severity the language
+        # model's order (from rank_suggestions) decides; without a model the
+        # more specific rule and then the longer span win
+        if self.language_model is not None:
+            return (c.severity_code, order)
+        specificity = self.rule_specificity[c.rule_id] if c.rule_id >= 0 else len(c.original)
+        return (c.severity_code, -specificity, c.start - c.end, order)
+
+    def resolve_conflicts(self, corrections: List[Correction]) -> List[Correction]:
+        """Merge duplicates and keep one correction per overlapping span.
+
+        Word-level corrections are sorted by span once and swept into groups
+        of overlapping intervals. Within a group the best-ranked corrections
+        are kept as long as they don't overlap each other; each clash check
+        is a Fenwick-tree query, so the whole pass is O(n log n). This way
+        "a apple" caught by two article rules counts once. No-op matches
+        (like "I " matched by the capitalization rule) are dropped.
+        Sentence-level checks are a separate layer: only exact repeats of
+        them are merged.
+        """
+        spans = []
+        sentence_level = []
+        seen_sentences = set()
+        for order, c in enumerate(corrections):
+            if c.suggestion == c.original:
+                continue
+            if c.type_code in SENTENCE_LEVEL_TYPES:
+                key = (c.type_code, c.start, c.end)
+                if key not in seen_sentences:
+                    seen_sentences.add(key)
+                    sentence_level.append(c)
+            else:
+                spans.append((order, c))
+
+        spans.sort(key=lambda item: (item[1].start, item[1].end))
+        kept = []
+        group = []
+        group_end = -1
+        for item in spans + [None]:
+            if item is not None and item[1].start < group_end:
+                group.append(item)
+                group_end = max(group_end, item[1].end)
+                continue
+            if len(group) == 1:
+                kept.extend(group)
+            elif group:
+                # A candidate clashes with an accepted span iff one starting
+                # before its end reaches past its start: a prefix max over
+                # accepted ends, indexed by start, answers that in O(log k)
+                starts = sorted({c.start for _, c in group})
+                ends = MaxPrefixTree(len(starts))
+                for candidate in sorted(group, key=self._conflict_rank):
+                    c = candidate[1]
+                    if ends.max_before(bisect_left(starts, c.end)) > c.start:
+                        continue
+                    ends.update(bisect_left(starts, c.start), c.end)
+                    kept.append(candidate)
+            if item is not None:
+                group = [item]
+                group_end = item[1].end
+
+        kept.sort(key=lambda item: item[0])
+        return [c for _, c in kept] + sentence_level
+
+    def _engine(self, engine: Optional[str]) -> str:
+        if engine is None:
+            return self.engine
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown rule engine {engine!r}, expected one of {ENGINES}")
+        return engine
+
+    def match_text(self, text: str, age: int = 12, doc=None) -> List[Correction]:
+        """Rule and spelling corrections (everything except the structure checks).
+
+        Rules are matched on the regex engine unless ``doc`` (the parsed
+        ``text``) is given, in which case the token engine reuses its tokens.
+        """
+        if doc is None:
+            corrections = self.match_rules(text, age)
+        else:
+            corrections = self.token_engine.match(doc, self.rules_for_age(age))
+        corrections.extend(self.match_spelling(text, corrections))
+        return self.rank_suggestions(text, corrections)
+
+    def detect(self, text: str, age: int = 12, engine: Optional[str] = None) -> List[Correction]:
+        """Detect errors using age-appropriate patterns and spaCy checks"""
+        use_tokens = self._engine(engine) == 'token'
+        doc = self.nlp(text)
+        corrections = self.match_text(text, age, doc if use_tokens else None)
+        corrections.extend(spacy_structure_check(doc))
+        return self.resolve_conflicts(corrections)
+
+    def detect_many(self, texts: Sequence[str], age: int = 12,
+                    engine: Optional[str] = None) -> CorrectionBatch:
+        """Detect errors in many texts, returned as one columnar batch"""
+        use_tokens = self._engine(engine) == 'token'
+        batch = CorrectionBatch()
+        # nlp.pipe parses the texts in batches instead of one call per text
+        for text, doc in zip(texts, self.nlp.pipe(texts)):
+            corrections = self.match_text(text, age, doc if use_tokens else None)
+            corrections.extend(spacy_structure_check(doc))
+            batch.add_text(self.resolve_conflicts(corrections))
+        return batch
+
+    def correct(self, text: str, age: int = 12,
+                corrections: Optional[List[Correction]] = None) -> str:
+        """Apply the age-appropriate corrections to text.
+
+        ``corrections`` are the resolved ones from ``detect`` (positions
+        relative to ``text``); without them they are matched and resolved
+        here. Each overlap has a single winner, so the text gets exactly the
+        suggestions that were ranked best.
+        """
+        if corrections is None:
+            corrections = self.resolve_conflicts(self.match_text(text, age))
+        return capitalize_sentences(replace_spans(
+            text, [c for c in corrections if c.type_code not in SENTENCE_LEVEL_TYPES]))
+
+    def analyze(self, text: str, age: int = 12, engine: Optional[str] = None) -> Dict:
+        """Full analysis: corrections, corrected text, score and feedback"""
+        corrections = self.detect(text, age, engine)
+        score = calculate_comprehensive_score(text, corrections)
+        return {
+            'original': text,
+            'corrected': self.correct(text, age, corrections),
+            'corrections': corrections,
+            'score': score,
+            'feedback': generate_detailed_feedback(score, corrections, age),
+            'suggestions': generate_targeted_suggestions(corrections, age),
+            'age': age
+        }
+
+    def analyze_stream(self, text: str, age: int = 12,
+                       window_chars: int = WINDOW_CHARS,
+                       engine: Optional[str] = None) -> Iterator[StreamChunk]:
+        """Analyze a long document window by window.
+
+        Each window is a run of whole sentences of roughly ``window_chars``
+        characters, so only one window is matched and parsed at a time.
+        Correction positions are document offsets and ``score`` is the running
+        score of everything seen so far; after the last chunk it equals the
+        score ``analyze`` gives for the same corrections.
+        """
+        word_count = 0
+        unique_words = set()
+        total_penalty = 0
+        for start, end in iter_sentence_windows(text, window_chars):
+            window = text[start:end]
+            corrections = self.detect(window, age, engine)
+            corrected = self.correct(window, age, corrections)
+            corrections = [shift_correction(c, start) for c in corrections]
+            words = window.split()
+            word_count += len(words)
+            unique_words.update(words)
+            total_penalty += sum(correction_penalty(c) for c in corrections)
+            yield StreamChunk(start, end, corrections, corrected,
+                              score_from_counts(word_count, len(unique_words), total_penalty),
+                              word_count)
@@ -0,0 +1,243 @@
+"""
+Learner History Store - submissions, scores and error types in SQLite
+Writes are queued to a background thread; indexed reads answer progress queries
+"""
+
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+from corpus import DATA_DIR
+
+DEFAULT_DB_PATH = os.path.join(DATA_DIR, "learner_history.db")
+DAY = 86400
+# Pause before retrying a failed batch (e.g. a lock held by another process)
+RETRY_DELAY = 1.0
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS submissions (
+    id INTEGER PRIMARY KEY,
+    student_id TEXT NOT NULL,
+    class_id TEXT NOT NULL DEFAULT '',
+    created_at INTEGER NOT NULL,
+    age INTEGER,
+    score INTEGER,
+    word_count INTEGER,
+    correction_count INTEGER
+);
+-- One row per correction, denormalized so aggregates never need a join
+CREATE TABLE IF NOT EXISTS submission_errors (
+    submission_id INTEGER NOT NULL REFERENCES submissions(id),
+    student_id TEXT NOT NULL,
+    class_id TEXT NOT NULL DEFAULT '',
+    created_at INTEGER NOT NULL,
+    error_type TEXT NOT NULL,
+    severity TEXT NOT NULL
+);
+-- Daily rollups, updated with each written batch, keep trends O(days)
+CREATE TABLE IF NOT EXISTS daily_errors (
+    error_type TEXT NOT NULL,
+    day INTEGER NOT NULL,
+    class_id TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (error_type, day, class_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS daily_submissions (
+    day INTEGER NOT NULL,
+    class_id TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (day, class_id)
+) WITHOUT ROWID;
+-- Every query below is answered from one of these indexes alone
+CREATE INDEX IF NOT EXISTS idx_submissions_student_time
+    ON submissions (student_id, created_at, score);
+CREATE INDEX IF NOT EXISTS idx_errors_student_time_type
+    ON submission_errors (student_id, created_at, error_type);
+CREATE INDEX IF NOT EXISTS idx_daily_errors_class
+    ON daily_errors (class_id, error_type, day);
+CREATE INDEX IF NOT EXISTS idx_daily_submissions_class
+    ON daily_submissions (class_id, day);
+"""
+
+
+class HistoryStore:
+    """Progress history for learners, safe to share between threads.
+
+    ``record`` only puts the result on a queue, so saving never adds latency
+    to an analysis request. A single writer thread drains the queue and
+    writes whole batches in one transaction. Readers use their own
+    per-thread connections; WAL mode lets them run while a batch is written.
+    """
+
+    def __init__(self, path: str = DEFAULT_DB_PATH, batch_size: int = 500,
+                 flush_interval: float = 0.5):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._local = threading.local()
+        self._queue = queue.Queue()
+
+        connection = sqlite3.connect(path)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.executescript(SCHEMA)
+        connection.close()
+
+        self._writer = threading.Thread(target=self._write_loop, name="history-writer", daemon=True)
+        self._writer.start()
+
+    def _connection(self) -> sqlite3.Connection:
+        """This thread's read connection"""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path)
+            connection.execute("PRAGMA query_only=ON")
+            self._local.connection = connection
+        return connection
+
+    # ===== Writes =====
+
+    def record(self, student_id: str, result: Dict, class_id: str = '') -> None:
+        """Queue an analysis result (as returned by GrammarAnalyzer.analyze)"""
+        corrections = result['corrections']
+        self._queue.put((
+            (student_id, class_id, int(time.time()), result.get('age'), result['score'],
+             len(result['original'].split()), len(corrections)),
+            [(c.type, c.severity) for c in corrections]
+        ))
+
+    def _write_loop(self) -> None:
+        connection = sqlite3.connect(self.path)
+        connection.execute("PRAGMA synchronous=NORMAL")
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    # Write what we have, then stop on the next loop
+                    self._queue.task_done()
+                    self._queue.put(None)
+                    break
+                batch.append(item)
+            try:
+                self._write_safely(connection, batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+        connection.close()
+
+    def _write_safely(self, connection: sqlite3.Connection, batch: List[Tuple]) -> None:
+        """Write a batch without ever raising: the writer thread must stay alive"""
+        try:
+            self._write_batch(connection, batch)
+            return
+        except Exception:
+            logger.warning("Writing %d history records failed, retrying", len(batch), exc_info=True)
+        time.sleep(RETRY_DELAY)
+        try:
+            self._write_batch(connection, batch)
+            return
+        except Exception:
+            pass
+        # Still failing: one bad record shouldn't cost the rest of the batch
+        for item in batch:
+            try:
+                self._write_batch(connection, [item])
+            except Exception:
+                logger.exception("Dropped the history record of student %r", item[0][0])
+
+    @staticmethod
+    def _write_batch(connection: sqlite3.Connection, batch: List[Tuple]) -> None:
+        with connection:
+            cursor = connection.cursor()
+            error_rows = []
+            for submission, errors in batch:
+                cursor.execute(
+                    "INSERT INTO submissions (student_id, class_id, created_at, age, score, "
+                    "word_count, correction_count) VALUES (?, ?, ?, ?, ?, ?, ?)", submission)
+                submission_id = cursor.lastrowid
+                student_id, class_id, created_at = submission[:3]
+                error_rows.extend((submission_id, student_id, class_id, created_at, error_type, severity)
+                                  for error_type, severity in errors)
+            cursor.executemany(
+                "INSERT INTO submission_errors (submission_id, student_id, class_id, created_at, "
+                "error_type, severity) VALUES (?, ?, ?, ?, ?, ?)", error_rows)
+
+            daily_errors = Counter((error_type, created_at // DAY * DAY, class_id)
+                                   for _, _, class_id, created_at, error_type, _ in error_rows)
+            daily_submissions = Counter((submission[2] // DAY * DAY, submission[1])
+                                        for submission, _ in batch)
+            cursor.executemany(
+                "INSERT INTO daily_errors (error_type, day, class_id, count) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (error_type, day, class_id) DO UPDATE SET count = count + excluded.count",
+                [key + (count,) for key, count in daily_errors.items()])
+            cursor.executemany(
+                "INSERT INTO daily_submissions (day, class_id, count) VALUES (?, ?, ?) "
+                "ON CONFLICT (day, class_id) DO UPDATE SET count = count + excluded.count",
+                [key + (count,) for key, count in daily_submissions.items()])
+
+    def flush(self) -> None:
+        """Block until everything queued so far has been written"""
+        self._queue.join()
+
+    def close(self) -> None:
+        """Write pending results and stop the writer thread"""
+        self._queue.put(None)
+        self._writer.join()
+
+    # ===== Reads =====
+
+    def top_error_types(self, student_id: str, days: int = 90,
+                        limit: int = 5) -> List[Tuple[str, int]]:
+        """Most frequent error types for a student over the last ``days``"""
+        since = int(time.time()) - days * DAY
+        return self._connection().execute(
+            "SELECT error_type, COUNT(*) AS n FROM submission_errors "
+            "WHERE student_id = ? AND created_at >= ? "
+            "GROUP BY error_type ORDER BY n DESC LIMIT ?",
+            (student_id, since, limit)).fetchall()
+
+    def score_history(self, student_id: str, days: int = 90) -> List[Tuple[int, int]]:
+        """(timestamp, score) of a student's submissions, oldest first"""
+        since = int(time.time()) - days * DAY
+        return self._connection().execute(
+            "SELECT created_at, score FROM submissions "
+            "WHERE student_id = ? AND created_at >= ? ORDER BY created_at",
+            (student_id, since)).fetchall()
+
+    def error_trend(self, error_type: str, class_id: Optional[str] = None,
+                    days: int = 90) -> List[Tuple[int, int, int]]:
+        """Daily (day_start, errors, submissions) for one error type, optionally for one class"""
+        since = int(time.time()) - days * DAY
+        connection = self._connection()
+        if class_id is None:
+            errors = connection.execute(
+                "SELECT day, SUM(count) FROM daily_errors "
+                "WHERE error_type = ? AND day >= ? GROUP BY day",
+                (error_type, since // DAY * DAY)).fetchall()
+            submissions = connection.execute(
+                "SELECT day, SUM(count) FROM daily_submissions WHERE day >= ? GROUP BY day",
+                (since // DAY * DAY,)).fetchall()
+        else:
+            errors = connection.execute(
+                "SELECT day, count FROM daily_errors "
+                "WHERE class_id = ? AND error_type = ? AND day >= ?",
+                (class_id, error_type, since // DAY * DAY)).fetchall()
+            submissions = connection.execute(
+                "SELECT day, count FROM daily_submissions WHERE class_id = ? AND day >= ?",
+                (class_id, since // DAY * DAY)).fetchall()
+        errors_by_day = dict(errors)
+        return [(day, errors_by_day.get(day, 0), count) for day, count in sorted(submissions)]
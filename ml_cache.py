@@ -0,0 +1,159 @@
+"""
+ML Correction Cache - seq2seq outputs remembered on disk
+Repeated sentences skip generate(); shared by threads, worker processes and restarts
+"""
+
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Tuple
+from corpus import DATA_DIR
+
+DEFAULT_CACHE_PATH = os.path.join(DATA_DIR, "ml_cache.db")
+MAX_ENTRIES = 200_000
+# Recency is only rewritten when older than this, so most hits stay read-only
+TOUCH_INTERVAL = 60
+# Check the size every this many inserts; evict down to EVICT_TO of the limit
+EVICT_EVERY = 200
+EVICT_TO = 0.9
+# Keep SQLite's bound-parameter count well under its limit
+CHUNK = 500
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS ml_corrections (
+    key BLOB PRIMARY KEY,
+    output TEXT NOT NULL,
+    last_used INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_ml_corrections_last_used ON ml_corrections (last_used);
+"""
+
+
+def normalize_sentence(text: str) -> str:
+    """Whitespace-insensitive form of a sentence, used for the cache key"""
+    return ' '.join(text.split())
+
+
+def cache_key(sentence: str, model_version: str, params: Iterable[Tuple[str, object]]) -> bytes:
+    """Key for one (normalized sentence, model, generation settings) combination"""
+    settings = ';'.join(f"{name}={value}" for name, value in sorted(params))
+    return hashlib.blake2b('\x1f'.join((model_version, settings, sentence)).encode('utf-8'),
+                           digest_size=16).digest()
+
+
+class CorrectionCache:
+    """Size-bounded LRU cache of model outputs in SQLite.
+
+    WAL mode lets lookups run while another thread or process writes, and a
+    busy timeout makes concurrent writers wait instead of failing. Each
+    thread (and each forked worker) opens its own connection. Eviction drops
+    the least recently used entries once the table grows past
+    ``max_entries``. ``stats`` counts this process's hits and misses.
+    SQLite errors (a lock held past the timeout, a full disk) are logged and
+    never raised: a failed lookup is a miss and a failed store is skipped.
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_entries: int = MAX_ENTRIES,
+                 busy_timeout: float = 5.0):
+        self.path = path
+        self.max_entries = max_entries
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._inserts = 0
+
+        connection = sqlite3.connect(path, timeout=busy_timeout)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.executescript(SCHEMA)
+        connection.close()
+
+    def _connection(self) -> sqlite3.Connection:
+        """This thread's connection (never one inherited across a fork)"""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            # ``timeout`` is SQLite's busy timeout: wait for other writers' locks
+            connection = sqlite3.connect(self.path, timeout=self.busy_timeout)
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def get_many(self, keys: List[bytes]) -> Dict[bytes, str]:
+        """Cached outputs for whichever of ``keys`` are present"""
+        found = {}
+        stale = []
+        now = int(time.time())
+        try:
+            connection = self._connection()
+            for i in range(0, len(keys), CHUNK):
+                chunk = keys[i:i + CHUNK]
+                rows = connection.execute(
+                    f"SELECT key, output, last_used FROM ml_corrections "
+                    f"WHERE key IN ({','.join('?' * len(chunk))})", chunk).fetchall()
+                for key, output, last_used in rows:
+                    found[key] = output
+                    if last_used < now - TOUCH_INTERVAL:
+                        stale.append((now, key))
+            if stale:
+                with connection:
+                    connection.executemany("UPDATE ml_corrections SET last_used = ? WHERE key = ?",
+                                           stale)
+        except sqlite3.Error:
+            # Outputs read before the failure are still valid; the rest are misses
+            logger.warning("ML cache lookup failed, generating instead", exc_info=True)
+        with self._lock:
+            self.hits += len(found)
+            self.misses += len(set(keys)) - len(found)
+        return found
+
+    def put_many(self, items: Dict[bytes, str]) -> None:
+        """Store new outputs, evicting old entries when the cache is full"""
+        if not items:
+            return
+        now = int(time.time())
+        try:
+            connection = self._connection()
+            with connection:
+                connection.executemany(
+                    "INSERT OR REPLACE INTO ml_corrections (key, output, last_used) VALUES (?, ?, ?)",
+                    [(key, output, now) for key, output in items.items()])
+            with self._lock:
+                self._inserts += len(items)
+                check = self._inserts >= EVICT_EVERY
+                if check:
+                    self._inserts = 0
+            if check:
+                self.evict()
+        except sqlite3.Error:
+            logger.warning("Storing %d ML outputs in the cache failed", len(items), exc_info=True)
+
+    def evict(self) -> int:
+        """Drop least recently used entries if over the limit; returns how many"""
+        connection = self._connection()
+        with connection:
+            size = connection.execute("SELECT COUNT(*) FROM ml_corrections").fetchone()[0]
+            if size <= self.max_entries:
+                return 0
+            excess = size - int(self.max_entries * EVICT_TO)
+            connection.execute(
+                "DELETE FROM ml_corrections WHERE key IN "
+                "(SELECT key FROM ml_corrections ORDER BY last_used LIMIT ?)", (excess,))
+        return excess
+
+    def stats(self) -> Dict[str, float]:
+        """Hits, misses and hit rate in this process, plus the cache size"""
+        try:
+            entries = self._connection().execute("SELECT COUNT(*) FROM ml_corrections").fetchone()[0]
+        except sqlite3.Error:
+            entries = None
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {'hits': self.hits, 'misses': self.misses,
+                    'hit_rate': self.hits / lookups if lookups else 0.0, 'entries': entries}
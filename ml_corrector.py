@@ -0,0 +1,169 @@
+"""
+ML Grammar Corrector - seq2seq (T5) corrections for the ML path
+Wraps the model fine-tuned in grammar_model_demo.ipynb
+
+Backends: 'torch' (fp32), 'torch-int8' (dynamically quantized Linear layers)
+and 'onnx-int8' (ONNX Runtime export, int8, needs: pip install optimum[onnxruntime])
+"""
+
+import os
+import threading
+from typing import List, Optional
+from corpus import DATA_DIR
+from ml_cache import CorrectionCache, cache_key, normalize_sentence
+
+try:
+    import torch
+    from transformers import AutoModelForSeq2SeqLM, AutoTokenizer
+    TRANSFORMERS_AVAILABLE = True
+except ImportError:
+    TRANSFORMERS_AVAILABLE = False
+
+# The notebook's Trainer writes to ./t5-demo and starts from t5-small
+DEFAULT_MODEL_DIR = os.path.join(DATA_DIR, "t5-demo")
+BASE_TOKENIZER = "t5-small"
+MAX_LENGTH = 64
+BACKENDS = ('torch', 'torch-int8', 'onnx-int8')
+# Exported ONNX models, one subdirectory per source model
+ONNX_DIR = os.path.join(DATA_DIR, "onnx-int8")
+
+
+def model_version(model_dir: str) -> str:
+    """Identifies the weights in ``model_dir``: retraining in place changes it"""
+    files = sorted(name for name in os.listdir(model_dir)
+                   if name.endswith(('.bin', '.safetensors', '.json'))) if os.path.isdir(model_dir) else []
+    stamps = [f"{name}:{os.path.getsize(os.path.join(model_dir, name))}:"
+              f"{int(os.path.getmtime(os.path.join(model_dir, name)))}" for name in files]
+    return f"{os.path.abspath(model_dir)}|{'|'.join(stamps)}"
+
+
+def export_onnx_int8(model_dir: str, output_dir: Optional[str] = None) -> str:
+    """Export a seq2seq model to ONNX with int8 dynamic quantization.
+
+    The decoder is exported with past key/values (use_cache), so generation
+    runs the encoder once and each new token only attends over cached
+    tensors. The export is redone only when the source weights change.
+    """
+    try:
+        from optimum.onnxruntime import ORTModelForSeq2SeqLM, ORTQuantizer
+        from optimum.onnxruntime.configuration import AutoQuantizationConfig
+    except ImportError:
+        raise ImportError("Please install: pip install optimum[onnxruntime]")
+    if output_dir is None:
+        output_dir = os.path.join(ONNX_DIR, os.path.basename(os.path.normpath(model_dir)))
+    version = model_version(model_dir)
+    version_path = os.path.join(output_dir, "source_version.txt")
+    if os.path.exists(version_path):
+        with open(version_path, encoding='utf-8') as f:
+            if f.read() == version:
+                return output_dir
+
+    exported = ORTModelForSeq2SeqLM.from_pretrained(model_dir, export=True, use_cache=True,
+                                                    use_merged=False)
+    exported.save_pretrained(output_dir)
+    # Dynamic quantization: int8 weights, activation scales computed per batch
+    config = AutoQuantizationConfig.avx2(is_static=False, per_channel=False)
+    for name in sorted(os.listdir(output_dir)):
+        if name.endswith('.onnx') and not name.endswith('_quantized.onnx'):
+            ORTQuantizer.from_pretrained(output_dir, file_name=name).quantize(
+                save_dir=output_dir, quantization_config=config)
+    with open(version_path, 'w', encoding='utf-8') as f:
+        f.write(version)
+    return output_dir
+
+
+def load_model(model_dir: str, backend: str = 'torch'):
+    """The seq2seq model for ``backend``, ready for generate()"""
+    if backend == 'onnx-int8':
+        from optimum.onnxruntime import ORTModelForSeq2SeqLM
+        return ORTModelForSeq2SeqLM.from_pretrained(
+            export_onnx_int8(model_dir), use_cache=True,
+            encoder_file_name="encoder_model_quantized.onnx",
+            decoder_file_name="decoder_model_quantized.onnx",
+            decoder_with_past_file_name="decoder_with_past_model_quantized.onnx")
+    model = AutoModelForSeq2SeqLM.from_pretrained(model_dir).eval()
+    if backend == 'torch-int8':
+        # Linear layers hold nearly all of T5's weights and compute
+        model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    return model
+
+
+class Seq2SeqCorrector:
+    """Sentence correction with a fine-tuned seq2seq model (CPU inference).
+
+    With a ``cache``, sentences seen before (by this or any other process
+    sharing the cache file) are answered without running the model.
+    """
+
+    def __init__(self, model_dir: str = DEFAULT_MODEL_DIR, tokenizer_name: Optional[str] = None,
+                 max_length: int = MAX_LENGTH, num_beams: int = 1,
+                 cache: Optional[CorrectionCache] = None, backend: str = 'torch'):
+        if not TRANSFORMERS_AVAILABLE:
+            raise ImportError("Please install: pip install torch transformers sentencepiece")
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown backend {backend!r}, expected one of {BACKENDS}")
+        self.model_dir = model_dir
+        self.backend = backend
+        self.max_length = max_length
+        self.num_beams = num_beams
+        self.cache = cache
+        self.model_version = model_version(model_dir)
+        # Trainer checkpoints don't include the tokenizer, so fall back to the base one
+        if tokenizer_name is None:
+            has_tokenizer = any(os.path.exists(os.path.join(model_dir, name))
+                                for name in ("tokenizer_config.json", "spiece.model"))
+            tokenizer_name = model_dir if has_tokenizer else BASE_TOKENIZER
+        self.tokenizer = AutoTokenizer.from_pretrained(tokenizer_name)
+        self._model_lock = threading.Lock()
+        self._model_pid = os.getpid()
+        if backend == 'onnx-int8':
+            # ONNX Runtime sessions don't survive fork() (their thread pools
+            # stay behind in the parent), so only export here and open the
+            # session in the process that runs it; the .onnx files are mmapped
+            export_onnx_int8(model_dir)
+            self._model = None
+        else:
+            self._model = load_model(model_dir, backend)
+
+    @property
+    def model(self):
+        """The loaded model (for ONNX Runtime, this process's own session)"""
+        if self._model is None or (self.backend == 'onnx-int8' and self._model_pid != os.getpid()):
+            with self._model_lock:
+                if self._model is None or self._model_pid != os.getpid():
+                    self._model = load_model(self.model_dir, self.backend)
+                    self._model_pid = os.getpid()
+        return self._model
+
+    def _generation_params(self):
+        # Quantized backends may word a correction differently, so they cache separately
+        return (('max_length', self.max_length), ('num_beams', self.num_beams),
+                ('backend', self.backend))
+
+    def correct_batch(self, texts: List[str]) -> List[str]:
+        """Corrected version of each sentence"""
+        if self.cache is None:
+            return self._generate(texts)
+        sentences = [normalize_sentence(text) for text in texts]
+        params = self._generation_params()
+        keys = [cache_key(sentence, self.model_version, params) for sentence in sentences]
+        outputs = self.cache.get_many(keys)
+        # Each distinct uncached sentence is generated once
+        missing = {key: sentence for key, sentence in zip(keys, sentences) if key not in outputs}
+        if missing:
+            generated = dict(zip(missing, self._generate(list(missing.values()))))
+            self.cache.put_many(generated)
+            outputs.update(generated)
+        return [outputs[key] for key in keys]
+
+    def _generate(self, texts: List[str]) -> List[str]:
+        with torch.inference_mode():
+            inputs = self.tokenizer(texts, return_tensors="pt", padding=True,
+                                    truncation=True, max_length=self.max_length)
+            outputs = self.model.generate(**inputs, max_length=self.max_length,
+                                          num_beams=self.num_beams, use_cache=True)
+        return self.tokenizer.batch_decode(outputs, skip_special_tokens=True)
+
+    def correct(self, text: str) -> str:
+        """Corrected version of one sentence"""
+        return self.correct_batch([text])[0]
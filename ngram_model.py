@@ -0,0 +1,245 @@
+"""
+N-gram Language Model - compact fluency scores for ranking suggestions
+Trigram counts from the corrected side of the corpora, memory-mapped at run time
+
+Build the model once with:
+    python ngram_model.py
+"""
+
+import argparse
+import math
+import mmap
+import os
+import struct
+import sys
+import zlib
+from bisect import bisect_left
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from corpus import DATA_DIR, iter_fce_correct_sentences, iter_jfleg_targets, tokenize_words
+
+DEFAULT_MODEL_PATH = os.path.join(DATA_DIR, "ngram_model.bin")
+BOS, EOS = '<s>', '</s>'
+
+# Word ids are 21 bits so a trigram packs into one uint64 key
+ID_BITS = 21
+MAX_WORDS = (1 << ID_BITS) - 1
+# Counts are stored as round(log2(count) * QUANT_SCALE) in one byte
+QUANT_SCALE = 8
+# Stupid backoff (Brants et al., 2007)
+BACKOFF = math.log10(0.4)
+
+# Header: magic, byte order, vocabulary size, unigram total, bigram and trigram counts.
+# Sections (8-byte aligned): vocab hashes uint32, unigram counts uint8 (indexed by id),
+# bigram keys uint64, bigram counts uint8, trigram keys uint64, trigram counts uint8.
+MODEL_MAGIC = b'KENGRAM1'
+MODEL_HEADER = struct.Struct('<8sB7xIQII')
+BYTE_ORDERS = {'little': 1, 'big': 2}
+
+
+def word_hash(word: str) -> int:
+    return zlib.crc32(word.encode('utf-8'))
+
+def quantize(count: int) -> int:
+    """One-byte log-scale code for a positive count"""
+    return min(255, round(math.log2(count) * QUANT_SCALE))
+
+# log10 of the count each code stands for
+DEQUANTIZED = [code / QUANT_SCALE * math.log10(2) for code in range(256)]
+
+def _aligned(data: bytes) -> bytes:
+    return data + b'\0' * (-len(data) % 8)
+
+def corpus_sentences() -> Iterable[List[str]]:
+    """Token lists from JFLEG references and error-free FCE sentences"""
+    for sentence in iter_jfleg_targets():
+        yield tokenize_words(sentence)
+    for tokens in iter_fce_correct_sentences():
+        yield tokenize_words(' '.join(tokens))
+
+def build_ngram_model(sentences: Iterable[Sequence[str]], path: str = DEFAULT_MODEL_PATH) -> str:
+    """Count unigrams to trigrams and write the compact model file"""
+    unigrams, bigrams, trigrams = Counter(), Counter(), Counter()
+    for sentence in sentences:
+        if not sentence:
+            continue
+        words = [BOS] + list(sentence) + [EOS]
+        unigrams.update(words)
+        bigrams.update(zip(words, words[1:]))
+        trigrams.update(zip(words, words[1:], words[2:]))
+
+    vocab = sorted({word_hash(word) for word in unigrams})
+    if len(vocab) > MAX_WORDS:
+        raise ValueError(f"Vocabulary too large for {ID_BITS}-bit ids: {len(vocab)}")
+    # Id 0 is the unknown word, so known ids start at 1
+    ids = {h: i + 1 for i, h in enumerate(vocab)}
+    word_id = {word: ids[word_hash(word)] for word in unigrams}
+
+    unigram_counts = Counter()
+    for word, count in unigrams.items():
+        unigram_counts[word_id[word]] += count
+    unigram_codes = bytes([0] + [quantize(unigram_counts[i]) if unigram_counts[i] else 0
+                                 for i in range(1, len(vocab) + 1)])
+
+    def packed(counts: Counter) -> Tuple[List[int], bytes]:
+        merged = Counter()
+        for words, count in counts.items():
+            key = 0
+            for word in words:
+                key = (key << ID_BITS) | word_id[word]
+            merged[key] += count
+        keys = sorted(merged)
+        return keys, bytes(quantize(merged[key]) for key in keys)
+
+    bigram_keys, bigram_codes = packed(bigrams)
+    trigram_keys, trigram_codes = packed(trigrams)
+
+    header = MODEL_HEADER.pack(MODEL_MAGIC, BYTE_ORDERS[sys.byteorder], len(vocab),
+                               sum(unigrams.values()), len(bigram_keys), len(trigram_keys))
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(_aligned(header))
+        f.write(_aligned(struct.pack(f'={len(vocab)}I', *vocab)))
+        f.write(_aligned(unigram_codes))
+        f.write(_aligned(struct.pack(f'={len(bigram_keys)}Q', *bigram_keys)))
+        f.write(_aligned(bigram_codes))
+        f.write(_aligned(struct.pack(f'={len(trigram_keys)}Q', *trigram_keys)))
+        f.write(_aligned(trigram_codes))
+    os.replace(tmp_path, path)
+    return path
+
+
+class NgramModel:
+    """Read-only trigram model over a memory-mapped file.
+
+    Words are identified by their hash position in a sorted array and n-grams
+    by packed uint64 keys in sorted arrays, so a lookup is one C-level binary
+    search. Scores are stupid-backoff log10 values: higher means more fluent.
+    Nothing is mutated after loading, so the model can be shared by threads.
+    """
+
+    def __init__(self, path: str = DEFAULT_MODEL_PATH):
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, byte_order, n_vocab, total, n_bigrams, n_trigrams = MODEL_HEADER.unpack_from(self._mm)
+        if magic != MODEL_MAGIC:
+            raise ValueError(f"{path} is not an n-gram model")
+        if byte_order != BYTE_ORDERS[sys.byteorder]:
+            raise ValueError(f"{path} was built on a machine with different byte order; rebuild it")
+
+        view = memoryview(self._mm)
+        offset = len(_aligned(bytes(MODEL_HEADER.size)))
+
+        def section(count: int, fmt: str) -> memoryview:
+            nonlocal offset
+            size = count * struct.calcsize(fmt)
+            part = view[offset:offset + size].cast(fmt)
+            offset += size + (-size % 8)
+            return part
+
+        self._vocab = section(n_vocab, 'I')
+        self._unigram_codes = section(n_vocab + 1, 'B')
+        self._bigram_keys = section(n_bigrams, 'Q')
+        self._bigram_codes = section(n_bigrams, 'B')
+        self._trigram_keys = section(n_trigrams, 'Q')
+        self._trigram_codes = section(n_trigrams, 'B')
+        self.vocab_size = n_vocab
+        self._log_total = math.log10(total)
+        # Floor for words never seen in training
+        self._log_unknown = 2 * BACKOFF - math.log10(total + n_vocab)
+        self._bos = self.word_id(BOS)
+        self._eos = self.word_id(EOS)
+
+    def word_id(self, word: str) -> int:
+        """Vocabulary id of a word (0 if unknown)"""
+        h = word_hash(word)
+        i = bisect_left(self._vocab, h)
+        return i + 1 if i < self.vocab_size and self._vocab[i] == h else 0
+
+    def _log_count(self, keys: memoryview, codes: memoryview, key: int) -> Optional[float]:
+        i = bisect_left(keys, key)
+        if i < len(keys) and keys[i] == key:
+            return DEQUANTIZED[codes[i]]
+        return None
+
+    def _log_prob(self, u: int, v: int, w: int) -> float:
+        """Stupid-backoff log10 score of w after (u, v)"""
+        if w == 0:
+            return self._log_unknown
+        if u and v:
+            trigram = self._log_count(self._trigram_keys, self._trigram_codes,
+                                      (((u << ID_BITS) | v) << ID_BITS) | w)
+            if trigram is not None:
+                context = self._log_count(self._bigram_keys, self._bigram_codes, (u << ID_BITS) | v)
+                return trigram - context
+        if v:
+            bigram = self._log_count(self._bigram_keys, self._bigram_codes, (v << ID_BITS) | w)
+            if bigram is not None:
+                return BACKOFF + bigram - DEQUANTIZED[self._unigram_codes[v]]
+        return 2 * BACKOFF + DEQUANTIZED[self._unigram_codes[w]] - self._log_total
+
+    def score_tokens(self, tokens: Sequence[str], bos: bool = True, eos: bool = True,
+                     memo: Optional[Dict[Tuple[int, int, int], float]] = None) -> float:
+        """log10 score of a token sequence; ``memo`` shares lookups across calls"""
+        ids = [self.word_id(token) for token in tokens]
+        if bos:
+            ids.insert(0, self._bos)
+        if eos:
+            ids.append(self._eos)
+        total = 0.0
+        start = 1 if bos else 0
+        for i in range(start, len(ids)):
+            context = (ids[i - 2] if i >= 2 else 0, ids[i - 1] if i >= 1 else 0, ids[i])
+            if memo is not None and context in memo:
+                total += memo[context]
+                continue
+            value = self._log_prob(*context)
+            if memo is not None:
+                memo[context] = value
+            total += value
+        return total
+
+    def score(self, sentence: str) -> float:
+        """log10 score of a whole sentence"""
+        return self.score_tokens(tokenize_words(sentence))
+
+    def score_batch(self, texts: Sequence[str], bos: bool = False, eos: bool = False,
+                    per_token: bool = True) -> List[float]:
+        """Scores for several rewrites of the same passage.
+
+        Candidates usually differ in one span only, so lookups are shared
+        through a memo and the common words are only scored once. Rewrites
+        can differ in length and every extra word lowers a log-prob sum, so
+        by default each score is averaged over the tokens scored.
+        """
+        memo = {}
+        scores = []
+        for text in texts:
+            tokens = tokenize_words(text)
+            score = self.score_tokens(tokens, bos, eos, memo)
+            if per_token:
+                score /= max(len(tokens) + eos, 1)
+            scores.append(score)
+        return scores
+
+    def best(self, texts: Sequence[str], bos: bool = False, eos: bool = False,
+             per_token: bool = True) -> int:
+        """Index of the most fluent text"""
+        scores = self.score_batch(texts, bos, eos, per_token)
+        return max(range(len(texts)), key=scores.__getitem__)
+
+
+def load_ngram_model(path: str = DEFAULT_MODEL_PATH) -> Optional[NgramModel]:
+    """Open the model if it has been built, otherwise None"""
+    if not os.path.exists(path):
+        return None
+    return NgramModel(path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the n-gram model from the bundled corpora")
+    parser.add_argument("--output", default=DEFAULT_MODEL_PATH)
+    args = parser.parse_args()
+
+    build_ngram_model(corpus_sentences(), args.output)
+    print(f"Wrote {args.output} ({os.path.getsize(args.output) / 1e6:.1f} MB)")
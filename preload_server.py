@@ -0,0 +1,245 @@
+"""
+Preloading Analysis Server - one model in memory, many worker processes
+Loads spaCy (and optionally T5) once, then forks workers that share it copy-on-write
+
+Run with:
+    python preload_server.py --workers 8 --port 8600
+    curl -X POST localhost:8600/analyze -d '{"text": "i are happy", "age": 9}'
+    curl -X POST localhost:8600/analyze -d '{"text": "i are happy", "engine": "token"}'
+    curl -X POST localhost:8600/analyze-many -d '{"texts": ["i are happy", "a apple"]}'
+
+Corrections come back columnar (``CorrectionBatch.to_columns``). /analyze-many
+answers in the binary batch format instead when sent ``Accept: application/octet-stream``;
+decode that with ``CorrectionBatch.from_bytes``.
+"""
+
+import argparse
+import gc
+import json
+import os
+import signal
+import socket
+import sys
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+import numpy as np
+import spacy
+from corpus import DATA_DIR
+from corrections import CorrectionBatch
+from grammar_analyzer import GrammarAnalyzer
+from ml_cache import DEFAULT_CACHE_PATH
+from token_rules import ENGINES
+from ngram_model import DEFAULT_MODEL_PATH, build_ngram_model, corpus_sentences, load_ngram_model
+from spelling_index import DEFAULT_INDEX_PATH, build_spelling_index, index_words, load_spelling_index
+
+SPACY_MODEL = "en_core_web_lg"
+VECTORS_DIR = os.path.join(DATA_DIR, "shared_vectors")
+
+
+def map_vectors_from_disk(nlp, directory: str = VECTORS_DIR) -> None:
+    """Swap the pipeline's word vectors for a memory-mapped copy on disk.
+
+    The vector table is most of en_core_web_lg's memory. Mapped from a file,
+    its pages live in the OS page cache once and are shared by every process
+    instead of each worker holding a private copy. The mapping is
+    copy-on-write ('c'), so code that expects a writable array still works.
+    """
+    vectors = nlp.vocab.vectors
+    if vectors.data.size == 0:
+        return
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{nlp.meta['lang']}_{nlp.meta['name']}_{nlp.meta['version']}.npy")
+    if not os.path.exists(path):
+        tmp_path = path + '.tmp.npy'
+        np.save(tmp_path, np.asarray(vectors.data))
+        os.replace(tmp_path, path)
+    vectors.data = np.load(path, mmap_mode='c')
+
+
+def load_shared_resources(spacy_model: str = SPACY_MODEL, t5_dir: Optional[str] = None,
+                          ml_cache_path: Optional[str] = None, ml_backend: str = 'torch') -> Dict:
+    """Everything the workers share, loaded once in the parent"""
+    nlp = spacy.load(spacy_model)
+    map_vectors_from_disk(nlp)
+
+    if not os.path.exists(DEFAULT_INDEX_PATH):
+        build_spelling_index(index_words())
+    if not os.path.exists(DEFAULT_MODEL_PATH):
+        build_ngram_model(corpus_sentences())
+    resources = {
+        'analyzer': GrammarAnalyzer(nlp, spelling=load_spelling_index(),
+                                    language_model=load_ngram_model()),
+        'ml': None
+    }
+    if t5_dir is not None:
+        from ml_cache import CorrectionCache
+        from ml_corrector import Seq2SeqCorrector
+        # One cache file for all workers: a sentence generated by one is a hit for the others
+        cache = CorrectionCache(ml_cache_path) if ml_cache_path else None
+        # Torch weights load here and are shared; an ONNX backend opens its
+        # session in each worker on first use (ORT sessions aren't fork-safe)
+        resources['ml'] = Seq2SeqCorrector(t5_dir, cache=cache, backend=ml_backend)
+    return resources
+
+
+def memory_usage() -> Dict[str, float]:
+    """This process's resident / proportional / shared memory in MB (Linux)"""
+    usage = {}
+    try:
+        with open('/proc/self/smaps_rollup') as f:
+            for line in f:
+                name, _, value = line.partition(':')
+                if name in ('Rss', 'Pss', 'Shared_Clean', 'Shared_Dirty', 'Private_Dirty'):
+                    usage[name] = int(value.split()[0]) / 1024
+    except OSError:
+        pass
+    return usage
+
+
+class AnalysisHandler(BaseHTTPRequestHandler):
+    """JSON API over the shared resources (set on the class before forking)"""
+    resources: Dict = {}
+
+    def _send_body(self, status: int, body: bytes,
+                   content_type: str = 'application/json; charset=utf-8') -> None:
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, status: int, payload: Dict) -> None:
+        self._send_body(status, json.dumps(payload, ensure_ascii=False).encode('utf-8'))
+
+    def do_GET(self):
+        if self.path == '/health':
+            ml = self.resources['ml']
+            self._send_json(200, {'pid': os.getpid(), 'memory_mb': memory_usage(),
+                                  'ml': ml is not None,
+                                  'ml_cache': ml.cache.stats() if ml is not None and ml.cache else None})
+        else:
+            self._send_json(404, {'error': 'not found'})
+
+    def do_POST(self):
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            request = json.loads(self.rfile.read(length) or b'{}')
+            if not isinstance(request, dict):
+                raise ValueError("request body is not a JSON object")
+            if self.path == '/analyze-many':
+                if not isinstance(request['texts'], list):
+                    raise TypeError("'texts' is not a list")
+                texts = [str(text) for text in request['texts']]
+            else:
+                text = str(request['text'])
+            age = int(request.get('age', 12))
+            engine = request.get('engine')
+        except (ValueError, KeyError, TypeError):
+            self._send_json(400, {'error': "expected a JSON object with a 'text' field (a 'texts' "
+                                           "list for /analyze-many) and an optional integer 'age'"})
+            return
+        if engine is not None and engine not in ENGINES:
+            self._send_json(400, {'error': f"'engine' must be one of {list(ENGINES)}"})
+            return
+
+        try:
+            if self.path == '/analyze':
+                result = self.resources['analyzer'].analyze(text, age, engine)
+                batch = CorrectionBatch()
+                batch.add_text(result['corrections'])
+                result['corrections'] = batch.to_columns()
+                self._send_json(200, result)
+            elif self.path == '/analyze-many':
+                batch = self.resources['analyzer'].detect_many(texts, age, engine)
+                if 'application/octet-stream' in self.headers.get('Accept', ''):
+                    self._send_body(200, batch.to_bytes(), 'application/octet-stream')
+                else:
+                    self._send_body(200, batch.to_json().encode('utf-8'))
+            elif self.path == '/correct-ml':
+                if self.resources['ml'] is None:
+                    self._send_json(503, {'error': 'server started without a T5 model'})
+                    return
+                self._send_json(200, {'original': text, 'corrected': self.resources['ml'].correct(text)})
+            else:
+                self._send_json(404, {'error': 'not found'})
+        except Exception as e:
+            # Answer instead of dropping the connection; the worker keeps serving
+            self._send_json(500, {'error': f"{type(e).__name__}: {e}"})
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_worker(listener: socket.socket) -> None:
+    """Serve requests on the inherited listening socket (runs in a child)"""
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    if AnalysisHandler.resources.get('ml') is not None:
+        import torch
+        # Workers already run in parallel; one intra-op thread each avoids oversubscription
+        torch.set_num_threads(1)
+    server = ThreadingHTTPServer(listener.getsockname(), AnalysisHandler, bind_and_activate=False)
+    server.socket.close()
+    server.socket = listener
+    server.server_name, server.server_port = listener.getsockname()[:2]
+    server.serve_forever()
+
+
+def spawn_worker(listener: socket.socket) -> int:
+    pid = os.fork()
+    if pid == 0:
+        try:
+            serve_worker(listener)
+        finally:
+            os._exit(0)
+    return pid
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-forking grammar analysis server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8600)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--spacy-model", default=SPACY_MODEL)
+    parser.add_argument("--t5-model", default=None, help="Directory of a fine-tuned seq2seq model")
+    parser.add_argument("--ml-cache", default=DEFAULT_CACHE_PATH,
+                        help="SQLite file caching T5 outputs ('' to disable)")
+    parser.add_argument("--ml-backend", default="torch",
+                        choices=("torch", "torch-int8", "onnx-int8"),
+                        help="T5 inference backend; the int8 ones are faster on CPU")
+    args = parser.parse_args()
+
+    AnalysisHandler.resources = load_shared_resources(args.spacy_model, args.t5_model, args.ml_cache,
+                                                       args.ml_backend)
+    # Warm up lazily-initialized state so children don't each build their own
+    AnalysisHandler.resources['analyzer'].analyze("warm up the pipeline", 12)
+
+    listener = socket.create_server((args.host, args.port), backlog=128)
+    # Move everything loaded so far out of the collector's reach: otherwise a
+    # collection in a child writes to object headers and un-shares the pages
+    gc.freeze()
+
+    workers = {spawn_worker(listener) for _ in range(args.workers)}
+    print(f"Serving on http://{args.host}:{args.port} with {len(workers)} workers "
+          f"(parent {memory_usage().get('Rss', 0):.0f} MB)")
+
+    def shutdown(signum, frame):
+        for pid in workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        sys.exit(0)
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+
+    # Replace workers that die
+    while True:
+        pid, _ = os.wait()
+        workers.discard(pid)
+        workers.add(spawn_worker(listener))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+"""
+Spelling Index - symmetric-delete (SymSpell-style) spelling correction
+Built offline from the bundled corpora and a word-frequency list, memory-mapped at run time
+
+Build the index once (needs wordfreq) with:
+    python spelling_index.py
+"""
+
+import argparse
+import mmap
+import os
+import struct
+import sys
+import zlib
+from collections import Counter
+from functools import lru_cache
+from typing import Dict, Iterable, List, NamedTuple, Optional
+from corpus import DATA_DIR, iter_fce_correct_tokens, iter_jfleg_targets, tokenize_words
+
+DEFAULT_INDEX_PATH = os.path.join(DATA_DIR, "spelling_index.bin")
+MAX_DISTANCE = 2
+PREFIX_LENGTH = 7
+MIN_COUNT = 2
+# The corpora miss everyday words ("grandma", "kitten"), so the index also
+# takes wordfreq words down to ~1.3 per million. Web text is full of common
+# misspellings, but they stay below this ("definately" 2.9, "teh" 3.04)
+DICTIONARY_MIN_ZIPF = 3.1
+
+# Header: magic, byte order, max distance, prefix length, word/bucket/entry counts, blob size.
+# Every section after it is an array of native uint32 (the blob is UTF-8 bytes).
+INDEX_MAGIC = b'KESPELL1'
+INDEX_HEADER = struct.Struct('<8sBBBxIIII')
+BYTE_ORDERS = {'little': 1, 'big': 2}
+
+
+class Suggestion(NamedTuple):
+    """A dictionary word close to the looked-up token"""
+    term: str
+    distance: int
+    count: int
+
+
+def key_hash(key: str) -> int:
+    """Stable 32-bit hash of a delete key"""
+    return zlib.crc32(key.encode('utf-8'))
+
+def deletes_by_level(word: str, max_distance: int) -> List[List[str]]:
+    """Strings reachable from ``word`` by deleting exactly 0, 1, ... max_distance characters"""
+    found = {word}
+    levels = [[word]]
+    for _ in range(max_distance):
+        next_level = []
+        for item in levels[-1]:
+            if len(item) <= 1:
+                continue
+            for i in range(len(item)):
+                shorter = item[:i] + item[i + 1:]
+                if shorter not in found:
+                    found.add(shorter)
+                    next_level.append(shorter)
+        levels.append(next_level)
+    return levels
+
+def deletes(word: str, max_distance: int) -> set:
+    """All strings reachable from ``word`` by deleting up to max_distance characters"""
+    return {key for level in deletes_by_level(word, max_distance) for key in level}
+
+def edit_distance(a: str, b: str, max_distance: int) -> int:
+    """Optimal string alignment distance, or max_distance + 1 once it is exceeded"""
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        row_min = i
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if (previous2 is not None and i > 1 and j > 1
+                    and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]):
+                value = min(value, previous2[j - 2] + 1)
+            current[j] = value
+            row_min = min(row_min, value)
+        if row_min > max_distance:
+            return max_distance + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+def count_corpus_words(min_count: int = MIN_COUNT) -> Dict[str, int]:
+    """Word counts from JFLEG reference sentences and FCE tokens labelled correct"""
+    counts = Counter()
+    for sentence in iter_jfleg_targets():
+        counts.update(tokenize_words(sentence))
+    counts.update(iter_fce_correct_tokens())
+    return {word: count for word, count in counts.items() if count >= min_count}
+
+def count_dictionary_words(min_zipf: float = DICTIONARY_MIN_ZIPF) -> Dict[str, int]:
+    """Common English words from the wordfreq lists, as occurrences per billion words"""
+    try:
+        from wordfreq import iter_wordlist, word_frequency, zipf_frequency
+    except ImportError:
+        raise ImportError("Please install: pip install wordfreq")
+    counts = {}
+    # The list is in frequency order, so stop at the first word below the floor
+    for word in iter_wordlist('en'):
+        if zipf_frequency(word, 'en') < min_zipf:
+            break
+        if word.isalpha() and word.isascii():
+            counts[word] = max(1, round(word_frequency(word, 'en') * 1e9))
+    return counts
+
+def index_words(min_count: int = MIN_COUNT, min_zipf: float = DICTIONARY_MIN_ZIPF) -> Dict[str, int]:
+    """Corpus words plus the frequency dictionary; dictionary counts win where both have a word"""
+    words = count_corpus_words(min_count)
+    words.update(count_dictionary_words(min_zipf))
+    return words
+
+def build_spelling_index(words: Dict[str, int], path: str = DEFAULT_INDEX_PATH,
+                         max_distance: int = MAX_DISTANCE,
+                         prefix_length: int = PREFIX_LENGTH) -> str:
+    """Write a memory-mappable symmetric-delete index for ``words`` (word -> count)"""
+    terms = sorted(words)
+    blob = bytearray()
+    word_offsets = [0]
+    for term in terms:
+        blob += term.encode('utf-8')
+        word_offsets.append(len(blob))
+
+    # Each delete of a word's prefix points back at the word
+    entries = []
+    for word_id, term in enumerate(terms):
+        for key in deletes(term[:prefix_length], max_distance):
+            entries.append((key_hash(key), word_id))
+
+    n_buckets = 1
+    while n_buckets < len(entries):
+        n_buckets *= 2
+    mask = n_buckets - 1
+    entries.sort(key=lambda entry: (entry[0] & mask, entry[0], entry[1]))
+    bucket_starts = [0] * (n_buckets + 1)
+    for hash_value, _ in entries:
+        bucket_starts[(hash_value & mask) + 1] += 1
+    for bucket in range(n_buckets):
+        bucket_starts[bucket + 1] += bucket_starts[bucket]
+
+    header = INDEX_HEADER.pack(INDEX_MAGIC, BYTE_ORDERS[sys.byteorder], max_distance,
+                               prefix_length, len(terms), n_buckets, len(entries), len(blob))
+    sections = [
+        word_offsets,
+        [words[term] for term in terms],
+        bucket_starts,
+        [hash_value for hash_value, _ in entries],
+        [word_id for _, word_id in entries],
+    ]
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(header)
+        for section in sections:
+            f.write(struct.pack(f'={len(section)}I', *section))
+        f.write(bytes(blob))
+    os.replace(tmp_path, path)
+    return path
+
+
+class SpellingIndex:
+    """Read-only symmetric-delete index over a memory-mapped file.
+
+    Lookups only read from the mapping, so one index can be shared by all
+    threads (and, after a fork, by all worker processes). Known words are
+    answered by a single bucket probe; misspellings probe the deletes of the
+    token's prefix and verify candidates with a bounded edit distance.
+    """
+
+    def __init__(self, path: str = DEFAULT_INDEX_PATH, cache_size: int = 65536):
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, byte_order, self.max_distance, self.prefix_length, n_words,
+         n_buckets, n_entries, blob_size) = INDEX_HEADER.unpack_from(self._mm)
+        if magic != INDEX_MAGIC:
+            raise ValueError(f"{path} is not a spelling index")
+        if byte_order != BYTE_ORDERS[sys.byteorder]:
+            raise ValueError(f"{path} was built on a machine with different byte order; rebuild it")
+
+        view = memoryview(self._mm)
+        offset = INDEX_HEADER.size
+
+        def section(count: int) -> memoryview:
+            nonlocal offset
+            part = view[offset:offset + 4 * count].cast('I')
+            offset += 4 * count
+            return part
+
+        self._word_offsets = section(n_words + 1)
+        self._word_counts = section(n_words)
+        self._bucket_starts = section(n_buckets + 1)
+        self._entry_hashes = section(n_entries)
+        self._entry_words = section(n_entries)
+        self._blob = view[offset:offset + blob_size]
+        self._mask = n_buckets - 1
+        self.word_count = n_words
+        # Learner text repeats the same words a lot; lru_cache is thread-safe
+        self.lookup = lru_cache(maxsize=cache_size)(self._lookup)
+
+    def _term(self, word_id: int) -> str:
+        return bytes(self._blob[self._word_offsets[word_id]:self._word_offsets[word_id + 1]]).decode('utf-8')
+
+    def _word_ids(self, key: str) -> Iterable[int]:
+        hash_value = key_hash(key)
+        bucket = hash_value & self._mask
+        for entry in range(self._bucket_starts[bucket], self._bucket_starts[bucket + 1]):
+            if self._entry_hashes[entry] == hash_value:
+                yield self._entry_words[entry]
+
+    def __contains__(self, word: str) -> bool:
+        return any(self._term(word_id) == word for word_id in self._word_ids(word[:self.prefix_length]))
+
+    def _lookup(self, word: str) -> List[Suggestion]:
+        """Closest dictionary words, best first ([] if nothing is close enough)"""
+        prefix = word[:self.prefix_length]
+        # Fast path: the word itself is in the dictionary
+        for word_id in self._word_ids(prefix):
+            if self._term(word_id) == word:
+                return [Suggestion(word, 0, self._word_counts[word_id])]
+
+        # Keys that needed more deletes than the best distance so far cannot
+        # lead to a closer word, so levels are visited in order and cut early
+        seen = set()
+        suggestions = []
+        best = self.max_distance
+        for level, keys in enumerate(deletes_by_level(prefix, self.max_distance)):
+            if level > best:
+                break
+            for key in keys:
+                for word_id in self._word_ids(key):
+                    if word_id in seen:
+                        continue
+                    seen.add(word_id)
+                    term = self._term(word_id)
+                    distance = edit_distance(word, term, best)
+                    if distance <= best:
+                        best = distance
+                        suggestions.append(Suggestion(term, distance, self._word_counts[word_id]))
+        # Only the closest words are useful as replacements
+        suggestions = [s for s in suggestions if s.distance == best]
+        suggestions.sort(key=lambda s: (-s.count, s.term))
+        return suggestions
+
+    def correction(self, word: str) -> Optional[str]:
+        """Best replacement for a misspelled lowercase word, or None"""
+        suggestions = self.lookup(word)
+        if not suggestions or suggestions[0].distance == 0:
+            return None
+        return suggestions[0].term
+
+
+def load_spelling_index(path: str = DEFAULT_INDEX_PATH) -> Optional[SpellingIndex]:
+    """Open the index if it has been built, otherwise None"""
+    if not os.path.exists(path):
+        return None
+    return SpellingIndex(path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the spelling index from the bundled corpora")
+    parser.add_argument("--output", default=DEFAULT_INDEX_PATH)
+    parser.add_argument("--min-count", type=int, default=MIN_COUNT)
+    parser.add_argument("--min-zipf", type=float, default=DICTIONARY_MIN_ZIPF,
+                        help="Frequency floor for dictionary words (Zipf scale)")
+    args = parser.parse_args()
+
+    words = index_words(args.min_count, args.min_zipf)
+    print(f"Indexing {len(words)} words...")
+    build_spelling_index(words, args.output)
+    print(f"Wrote {args.output} ({os.path.getsize(args.output) / 1e6:.1f} MB)")
@@ -0,0 +1,58 @@
+import random
+import pytest
+
+spacy = pytest.importorskip("spacy")
+
+from corrections import Correction, TYPE_CODES
+from grammar_analyzer import SENTENCE_LEVEL_TYPES, GrammarAnalyzer
+
+WORD_TYPES = [code for code in TYPE_CODES.values() if code not in SENTENCE_LEVEL_TYPES]
+
+
+@pytest.fixture(scope="module")
+def analyzer():
+    return GrammarAnalyzer(spacy.blank("en"))
+
+
+def random_corrections(rng, analyzer, count, length):
+    corrections = []
+    for _ in range(count):
+        start = rng.randrange(length)
+        end = start + rng.randint(1, 12)
+        original = f"w{start}-{end}"
+        corrections.append(Correction.from_codes(
+            rng.choice(WORD_TYPES), rng.randrange(3), start, end, original,
+            rng.choice([original, original.upper(), original + "s"]),
+            rng.randrange(-1, len(analyzer.rule_specificity))))
+    return corrections
+
+
+def greedy_reference(analyzer, corrections):
+    """Best-ranked first, skipping anything that overlaps a kept span"""
+    candidates = [(order, c) for order, c in enumerate(corrections) if c.suggestion != c.original]
+    kept = []
+    for order, c in sorted(candidates, key=analyzer._conflict_rank):
+        if all(c.end <= k.start or k.end <= c.start for _, k in kept):
+            kept.append((order, c))
+    return [c for _, c in sorted(kept, key=lambda item: item[0])]
+
+
+def test_resolve_conflicts_matches_greedy_reference(analyzer):
+    rng = random.Random(7)
+    for _ in range(2000):
+        corrections = random_corrections(rng, analyzer, rng.randint(0, 40), rng.choice([20, 80, 300]))
+        assert analyzer.resolve_conflicts(corrections) == greedy_reference(analyzer, corrections)
+
+
+def test_kept_spans_never_overlap(analyzer):
+    rng = random.Random(11)
+    corrections = random_corrections(rng, analyzer, 5000, 2000)
+    kept = sorted(analyzer.resolve_conflicts(corrections), key=lambda c: c.start)
+    assert all(a.end <= b.start for a, b in zip(kept, kept[1:]))
+
+
+def test_sentence_checks_are_only_deduplicated(analyzer):
+    structure = TYPE_CODES['Sentence Structure']
+    repeat = [Correction.from_codes(structure, 0, 0, 40, "a sentence", "Add a subject") for _ in range(2)]
+    word = Correction.from_codes(TYPE_CODES['Spelling'], 1, 2, 8, "recieve", "receive")
+    assert analyzer.resolve_conflicts(repeat + [word]) == [word, repeat[0]]
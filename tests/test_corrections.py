@@ -0,0 +1,34 @@
+import json
+
+from corrections import Correction, CorrectionBatch
+
+
+def sample_batch():
+    batch = CorrectionBatch()
+    batch.add_text([
+        Correction('Subject-Verb Agreement', 'i are', 'I am', (0, 5), 'high', 3),
+        Correction('Spelling', 'recieve', 'receive', (9, 16)),
+    ])
+    batch.add_text([])
+    batch.add_text([Correction('Article Usage', 'a apple', 'an apple', (2, 9), 'medium', 12)])
+    return batch
+
+
+def test_binary_round_trip():
+    batch = sample_batch()
+    decoded = CorrectionBatch.from_bytes(batch.to_bytes())
+    assert decoded.text_count == 3
+    assert [decoded.for_text(i) for i in range(3)] == [batch.for_text(i) for i in range(3)]
+
+
+def test_columns_render_the_same_fields_as_records():
+    batch = sample_batch()
+    columns = json.loads(batch.to_json())
+    assert columns['text_offsets'] == [0, 2, 2, 3]
+    for row, c in enumerate(batch):
+        error_type = columns['type'][row]
+        assert columns['error_types'][error_type] == c.type
+        assert columns['severities'][columns['severity'][row]] == c.severity
+        assert (columns['start'][row], columns['end'][row]) == c.position
+        explanation = columns['explanations'][error_type].replace('{original}', columns['original'][row])
+        assert explanation == c.explanation
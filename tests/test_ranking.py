@@ -0,0 +1,44 @@
+import pytest
+
+spacy = pytest.importorskip("spacy")
+
+from grammar_analyzer import GrammarAnalyzer
+
+# Two low-severity rules competing for "the informations"; the first is more specific
+PATTERNS = {
+    r'\bthe\s+informations\b': 'the information',
+    r'\binformations\b': 'pieces of information',
+}
+
+
+class PreferringModel:
+    """Language model stand-in that likes rewrites containing one phrase"""
+
+    def __init__(self, phrase):
+        self.phrase = phrase
+
+    def score_batch(self, texts):
+        return [1.0 if self.phrase in text else 0.0 for text in texts]
+
+
+def analyzer(language_model=None):
+    nlp = spacy.blank("en")
+    nlp.add_pipe("sentencizer")
+    return GrammarAnalyzer(nlp, PATTERNS, language_model=language_model)
+
+
+def test_specific_rule_wins_without_a_model():
+    result = analyzer().analyze("We got the informations today.", 16)
+    assert [c.suggestion for c in result['corrections']] == ['the information']
+    assert result['corrected'] == "We got the information today."
+
+
+def test_model_decides_between_rules_of_equal_severity():
+    result = analyzer(PreferringModel("pieces of")).analyze("We got the informations today.", 16)
+    assert [c.suggestion for c in result['corrections']] == ['pieces of information']
+    assert result['corrected'] == "We got the pieces of information today."
+
+
+def test_corrected_text_keeps_whitespace_around_spans():
+    grammar = GrammarAnalyzer(spacy.blank("en"), {r'\bi\s+': 'I '})
+    assert grammar.correct("so i  said  it", 16) == "So I  said  it"
@@ -0,0 +1,38 @@
+import pytest
+
+spacy = pytest.importorskip("spacy")
+pytest.importorskip("wordfreq")
+
+from grammar_analyzer import GrammarAnalyzer
+from spelling_index import SpellingIndex, build_spelling_index, index_words
+
+
+@pytest.fixture(scope="module")
+def analyzer(tmp_path_factory):
+    path = build_spelling_index(index_words(), str(tmp_path_factory.mktemp("spelling") / "index.bin"))
+    return GrammarAnalyzer(spacy.blank("en"), spelling=SpellingIndex(path))
+
+
+def suggestions(analyzer, text):
+    return {c.original: c.suggestion for c in analyzer.match_spelling(text)}
+
+
+@pytest.mark.parametrize("word, expected", [
+    ("recieve", "receive"),
+    ("definately", "definitely"),
+    ("seperate", "separate"),
+    ("accomodate", "accommodate"),
+    ("adress", "address"),
+])
+def test_misspellings_are_corrected(analyzer, word, expected):
+    assert suggestions(analyzer, f"I will {word} it today") == {word: expected}
+
+
+@pytest.mark.parametrize("word", ["grandma", "kitten", "unicorn", "dinosaur", "lego"])
+def test_real_words_are_left_alone(analyzer, word):
+    assert suggestions(analyzer, f"my {word} is great") == {}
+
+
+def test_rule_matches_are_not_spell_checked(analyzer):
+    corrections = analyzer.match_text("i dont recieve it")
+    assert [c.suggestion for c in corrections if c.type == 'Spelling'] == ['receive']
@@ -0,0 +1,24 @@
+import pytest
+
+pytest.importorskip("spacy")
+
+from grammar_analyzer import iter_sentence_windows
+
+
+def windows(text, max_chars):
+    return [text[start:end] for start, end in iter_sentence_windows(text, max_chars)]
+
+
+@pytest.mark.parametrize("max_chars", range(4, 40))
+def test_windows_cover_the_text_in_order(max_chars):
+    text = "It costs 3.50 dollars in the U.S. today. Really!  Yes.\nThe end"
+    assert ''.join(windows(text, max_chars)) == text
+
+
+def test_a_period_at_the_window_limit_is_not_a_sentence_end():
+    assert windows("It costs 3.50 dollars today.", 11) == ["It costs ", "3.50 ", "dollars ", "today."]
+    assert windows("We met in the U.S. last year.", 16) == ["We met in the ", "U.S. last year."]
+
+
+def test_windows_end_after_whole_sentences():
+    assert windows("Hi there. Bye now. ok", 9) == ["Hi there. ", "Bye now. ", "ok"]
@@ -0,0 +1,44 @@
+import random
+import re
+import pytest
+
+spacy = pytest.importorskip("spacy")
+
+from corpus import JFLEG_PATHS, iter_jfleg_pairs
+from grammar_analyzer import GrammarAnalyzer
+
+EXAMPLES = [
+    "i are going to the store",
+    "He are my friend and we likes to play",
+    "I have a apple and an banana",
+    "your going to love this book",
+    "the cat its very cute",
+]
+
+
+@pytest.fixture(scope="module")
+def analyzer():
+    return GrammarAnalyzer(spacy.blank("en"))
+
+
+def spans(corrections):
+    return sorted((c.start, c.end, c.suggestion, c.rule_id) for c in corrections)
+
+
+def with_odd_whitespace(text, rng):
+    """Same sentence with some spaces turned into runs of spaces, tabs and newlines"""
+    return re.sub(' ', lambda _: rng.choice([' ', ' ', '  ', '\t', ' \n ']), text)
+
+
+def test_token_engine_matches_regex_engine(analyzer):
+    rng = random.Random(3)
+    sentences = sorted({source for source, _ in iter_jfleg_pairs(JFLEG_PATHS[1:]) if source})
+    texts = EXAMPLES + sentences + [with_odd_whitespace(text, rng) for text in EXAMPLES + sentences]
+    found = 0
+    for text in texts:
+        doc = analyzer.nlp(text)
+        for age in (8, 12, 16):
+            expected = spans(analyzer.match_rules(text, age))
+            assert spans(analyzer.token_engine.match(doc, analyzer.rules_for_age(age))) == expected, text
+            found += len(expected)
+    assert found > 0
@@ -0,0 +1,194 @@
+"""
+Token Rule Engine - grammar patterns as spaCy Matcher rules over the parsed Doc
+An alternative to scanning the raw text with regexes; selectable per request
+
+Compare both engines on the JFLEG eval sentences with:
+    python token_rules.py
+"""
+
+import itertools
+import re
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+from spacy.matcher import Matcher, PhraseMatcher
+from corrections import Correction
+
+ENGINES = ('regex', 'token')
+# Expanding multi-word alternatives multiplies patterns; give up beyond this
+MAX_VARIANTS = 64
+# Whitespace beyond a single space is its own token in spaCy
+SPACE = {"IS_SPACE": True, "OP": "*"}
+
+LITERAL_PIECE = re.compile(r"(?:[A-Za-z]|\\')+")
+GROUP_PIECE = re.compile(r"\(((?:[A-Za-z ]|\\'|\|)+)\)")
+CLASS_PIECE = re.compile(r"\(?\[([A-Za-z]+)\]\\w\*\)?")
+
+
+def _unescape(text: str) -> str:
+    return text.replace("\\'", "'")
+
+
+class TokenRuleEngine:
+    """Grammar rules compiled to spaCy token patterns.
+
+    A pattern like ``\\b(He|She|It)\\s+(have|do|go)\\b`` is a sequence of
+    words, so it becomes a ``Matcher`` pattern on token ``LOWER`` values,
+    with optional whitespace tokens wherever the regex has ``\\s+`` (single
+    literal words go to a ``PhraseMatcher``). Literal words are split with
+    the pipeline's own tokenizer, so "dont" and "don't" line up with how the
+    Doc was tokenized. Each token match is confirmed by running the rule's
+    regex at the same position, which keeps the suggestions and spans
+    identical to the regex engine. Rules that are not token sequences
+    (``fallback_rules``) still run as regexes on ``doc.text``.
+    """
+
+    def __init__(self, nlp, rules: Sequence):
+        self.matcher = Matcher(nlp.vocab)
+        self.phrase_matcher = PhraseMatcher(nlp.vocab, attr="LOWER")
+        self.rules_by_key: Dict[int, object] = {}
+        self.rules_by_id = {rule.rule_id: rule for rule in rules}
+        fallback = []
+        for rule in rules:
+            compiled = self._compile(nlp, rule.pattern)
+            if compiled is None:
+                fallback.append(rule)
+                continue
+            key = f"rule-{rule.rule_id}"
+            self.rules_by_key[nlp.vocab.strings.add(key)] = rule
+            kind, patterns = compiled
+            if kind == 'phrase':
+                self.phrase_matcher.add(key, [nlp.make_doc(phrase) for phrase in patterns])
+            else:
+                self.matcher.add(key, patterns)
+        self.fallback_rules = tuple(fallback)
+        self.fallback_ids = frozenset(rule.rule_id for rule in fallback)
+
+    @staticmethod
+    def _word_specs(nlp, text: str) -> List[Dict]:
+        """Token specs for literal words, allowing extra whitespace between them"""
+        specs = []
+        for word in text.split(' '):
+            if specs:
+                specs.append(SPACE)
+            specs.extend({"LOWER": token.lower_} for token in nlp.tokenizer(word))
+        return specs
+
+    def _compile(self, nlp, pattern: str) -> Optional[Tuple[str, list]]:
+        """('phrase', [texts]) or ('tokens', [patterns]), or None if not translatable"""
+        body = pattern.replace('\\b', '')
+        if body.endswith('\\s+'):
+            body = body[:-len('\\s+')]
+        pieces = body.split('\\s+')
+        # A single word can't contain whitespace, so the PhraseMatcher is exact for it
+        if len(pieces) == 1 and LITERAL_PIECE.fullmatch(pieces[0]):
+            return 'phrase', [_unescape(pieces[0])]
+
+        # Each piece becomes a list of alternatives, each a list of token specs
+        options = []
+        for piece in pieces:
+            if options:
+                # \s+ spans double spaces and newlines, which spaCy makes SPACE tokens
+                options.append([[SPACE]])
+            if LITERAL_PIECE.fullmatch(piece):
+                options.append([self._word_specs(nlp, _unescape(piece))])
+            elif GROUP_PIECE.fullmatch(piece):
+                alternatives = [self._word_specs(nlp, _unescape(alt))
+                                for alt in GROUP_PIECE.fullmatch(piece).group(1).split('|')]
+                if all(len(specs) == 1 for specs in alternatives):
+                    options.append([[{"LOWER": {"IN": [specs[0]["LOWER"] for specs in alternatives]}}]])
+                else:
+                    options.append(alternatives)
+            elif CLASS_PIECE.fullmatch(piece):
+                letters = ''.join(sorted(set(CLASS_PIECE.fullmatch(piece).group(1).lower())))
+                options.append([[{"LOWER": {"REGEX": f"^[{letters}]"}}]])
+            else:
+                return None
+
+        variants = 1
+        for alternatives in options:
+            variants *= len(alternatives)
+        if variants > MAX_VARIANTS:
+            return None
+        return 'tokens', [sum(combination, []) for combination in itertools.product(*options)]
+
+    def match(self, doc, rules: Sequence) -> List[Correction]:
+        """Corrections for ``rules`` (one age band) found in a parsed Doc"""
+        allowed = {rule.rule_id for rule in rules}
+        text = doc.text
+        starts = set()
+        for match_id, start, _ in itertools.chain(self.matcher(doc), self.phrase_matcher(doc)):
+            rule = self.rules_by_key[match_id]
+            if rule.rule_id in allowed:
+                starts.add((rule.rule_id, doc[start].idx))
+
+        corrections = []
+        last_rule, last_end = -1, -1
+        for rule_id, start_char in sorted(starts):
+            # Like finditer, a rule's matches never overlap each other
+            if rule_id == last_rule and start_char < last_end:
+                continue
+            rule = self.rules_by_id[rule_id]
+            # Same regex, same position: identical span and suggestion
+            match = rule.regex.match(text, start_char)
+            if match is None:
+                continue
+            last_rule, last_end = rule_id, match.end()
+            try:
+                corrected = (rule.replacement(match) if callable(rule.replacement)
+                             else rule.regex.sub(rule.replacement, match.group()))
+            except Exception:
+                continue
+            corrections.append(Correction.from_codes(
+                rule.type_code, rule.severity_code, match.start(), match.end(),
+                match.group().strip(), corrected.strip(), rule.rule_id
+            ))
+        for rule in rules:
+            if rule.rule_id not in self.fallback_ids:
+                continue
+            for match in rule.regex.finditer(text):
+                try:
+                    corrected = (rule.replacement(match) if callable(rule.replacement)
+                                 else rule.regex.sub(rule.replacement, match.group()))
+                except Exception:
+                    continue
+                corrections.append(Correction.from_codes(
+                    rule.type_code, rule.severity_code, match.start(), match.end(),
+                    match.group().strip(), corrected.strip(), rule.rule_id
+                ))
+        return corrections
+
+
+def compare_engines(analyzer, texts: Sequence[str], age: int = 15) -> Dict[str, float]:
+    """Speed of both engines and how far the token engine agrees with the regex one"""
+    timings = {}
+    found = {}
+    for engine in ENGINES:
+        started = time.perf_counter()
+        found[engine] = [{(c.start, c.end, c.suggestion) for c in analyzer.detect(text, age, engine)}
+                         for text in texts]
+        timings[engine] = time.perf_counter() - started
+    shared = sum(len(r & t) for r, t in zip(found['regex'], found['token']))
+    regex_total = sum(len(r) for r in found['regex'])
+    token_total = sum(len(t) for t in found['token'])
+    return {
+        'texts': len(texts),
+        'regex_seconds': timings['regex'],
+        'token_seconds': timings['token'],
+        # How many regex corrections the token engine also finds, and vice versa
+        'recall_vs_regex': shared / regex_total if regex_total else 1.0,
+        'precision_vs_regex': shared / token_total if token_total else 1.0,
+    }
+
+
+if __name__ == "__main__":
+    import spacy
+    from corpus import iter_jfleg_pairs, JFLEG_PATHS
+    from grammar_analyzer import GrammarAnalyzer
+
+    nlp = spacy.load("en_core_web_lg")
+    analyzer = GrammarAnalyzer(nlp)
+    sentences = sorted({source for source, _ in iter_jfleg_pairs(JFLEG_PATHS[1:])})
+    print(f"Untranslated rules (run as regex): {len(analyzer.token_engine.fallback_rules)}")
+    for name, value in compare_engines(analyzer, sentences).items():
+        print(f"{name.replace('_', ' ').title()}: {value:.3f}" if isinstance(value, float)
+              else f"{name.replace('_', ' ').title()}: {value}")